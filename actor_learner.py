@@ -0,0 +1,264 @@
+import multiprocessing as mp
+import time
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from constants import *
+from symmetry import random_symmetries
+
+class TransitionQueue:
+    # single-producer single-consumer ring of transitions in shared memory;
+    # the actor bumps written after filling a slot, the learner bumps read after copying it
+    FIELDS = (
+        ("states", (STATE_SIZE,), np.uint8),
+        ("actions", (), np.int16),
+        ("rewards", (), np.float32),
+        ("next_states", (STATE_SIZE,), np.uint8),
+        ("dones", (), np.bool_)
+    )
+
+    def __init__(self, slots: int = 4096, name: str | None = None):
+        self.slots = slots
+        size = 2 * np.dtype(np.int64).itemsize + sum(
+            slots * int(np.prod(shape, dtype=int)) * np.dtype(dtype).itemsize for _, shape, dtype in self.FIELDS
+        )
+        self.memory = SharedMemory(name=name, create=name is None, size=size)
+        self.counters = np.ndarray(2, dtype=np.int64, buffer=self.memory.buf)
+        offset = self.counters.nbytes
+        for field, shape, dtype in self.FIELDS:
+            array = np.ndarray((slots, *shape), dtype=dtype, buffer=self.memory.buf, offset=offset)
+            setattr(self, field, array)
+            offset += array.nbytes
+        if name is None:
+            self.counters[:] = 0
+
+    def __getstate__(self):
+        return {"slots": self.slots, "name": self.memory.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["slots"], state["name"])
+
+    def put(self, state, action, reward, next_state, done, stop=None) -> bool:
+        written = int(self.counters[0])
+        while written - self.counters[1] >= self.slots:
+            if stop is not None and stop.is_set():
+                return False
+            time.sleep(0.001)
+        slot = written % self.slots
+        self.states[slot] = state
+        self.actions[slot] = action
+        self.rewards[slot] = reward
+        self.next_states[slot] = next_state
+        self.dones[slot] = done
+        self.counters[0] = written + 1
+        return True
+
+    def drain(self, memory) -> int:
+        written, read = int(self.counters[0]), int(self.counters[1])
+        for index in range(read, written):
+            slot = index % self.slots
+            memory.add(self.states[slot], self.actions[slot], self.rewards[slot], self.next_states[slot], self.dones[slot])
+        self.counters[1] = written
+        return written - read
+
+    def close(self):
+        # the views must go before the mapping can be closed
+        self.counters = None
+        for field, _, _ in self.FIELDS:
+            setattr(self, field, None)
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+class SharedWeights:
+    # flat float32 weights behind a sequence counter that is odd while a copy is being written
+    def __init__(self, size: int, name: str | None = None):
+        self.size = size
+        self.memory = SharedMemory(name=name, create=name is None, size=8 + 4 * size)
+        self.version = np.ndarray(1, dtype=np.int64, buffer=self.memory.buf)
+        self.values = np.ndarray(size, dtype=np.float32, buffer=self.memory.buf, offset=8)
+        if name is None:
+            self.version[0] = 0
+
+    def __getstate__(self):
+        return {"size": self.size, "name": self.memory.name}
+
+    def __setstate__(self, state):
+        self.__init__(state["size"], state["name"])
+
+    def publish(self, values: np.ndarray):
+        self.version[0] += 1
+        self.values[:] = values
+        self.version[0] += 1
+
+    def read(self, last_version: int = 0) -> tuple[int, np.ndarray] | None:
+        version = int(self.version[0])
+        if version & 1 or version == last_version:
+            return None
+        values = self.values.copy()
+        if int(self.version[0]) != version:
+            return None
+        return version, values
+
+    def close(self):
+        self.version = None
+        self.values = None
+        self.memory.close()
+
+    def unlink(self):
+        self.memory.unlink()
+
+def flatten_weights(weights: list[np.ndarray]) -> np.ndarray:
+    return np.concatenate([weight.ravel() for weight in weights]).astype(np.float32)
+
+def unflatten_weights(values: np.ndarray, shapes: list[tuple[int, ...]]) -> list[np.ndarray]:
+    weights = []
+    offset = 0
+    for shape in shapes:
+        size = int(np.prod(shape, dtype=int))
+        weights.append(values[offset:offset + size].reshape(shape))
+        offset += size
+    return weights
+
+def actor(actor_id, transitions, weights, stats, stop, seed, sync_every):
+    import tensorflow as tf
+    import train
+    from env import Env
+
+    # actors share the machine with each other and the learner
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    model = train.build_model()
+    shapes = [weight.shape for weight in model.get_weights()]
+    q_values = train.make_q_values(model)
+    env = Env(seed=seed)
+    rng = np.random.default_rng(seed)
+    epsilon = train.epsilon
+    version = 0
+    steps = 0
+    episodes = 0
+    start = time.perf_counter()
+    try:
+        while not stop.is_set():
+            # env states are views of one buffer that env.step overwrites
+            state = env.reset().copy()
+            for _ in range(200):
+                if steps % sync_every == 0:
+                    update = weights.read(version)
+                    if update is not None:
+                        version, values = update
+                        model.set_weights(unflatten_weights(values, shapes))
+                action = train.act(env, q_values, state, epsilon, rng)
+                next_state, score, bonus, done = env.step(action)
+                if not transitions.put(state, action, score + bonus, next_state, done, stop):
+                    return
+                state = next_state.copy()
+                steps += 1
+                if done:
+                    break
+            episodes += 1
+            epsilon = max(train.epsilon_min, epsilon * train.epsilon_decay)
+            stats[3 * actor_id:3 * actor_id + 3] = [steps, episodes, time.perf_counter() - start]
+    finally:
+        transitions.close()
+        weights.close()
+
+def report(stats, actors, received, trained, elapsed):
+    print(f"Learner: {received} transitions, {trained} updates, {received / elapsed:.1f} steps/s")
+    for actor_id, process in enumerate(actors):
+        steps, episodes, seconds = stats[3 * actor_id:3 * actor_id + 3]
+        rate = steps / seconds if seconds else 0.0
+        state = "alive" if process.is_alive() else f"exited {process.exitcode}"
+        print(f"  actor {actor_id}: {int(steps)} steps, {int(episodes)} episodes, {rate:.1f} steps/s, {state}")
+
+def learn(
+    number_of_actors: int = 4,
+    total_steps: int = 200000,
+    seed: int = 0,
+    queue_slots: int = 4096,
+    publish_every: int = 100,
+    sync_every: int = 50,
+    report_every: float = 10.0
+):
+    # actors act with a copy of the weights republished every publish_every updates
+    # and checked every sync_every env steps; the learner owns the replay buffer and optimizer
+    import train
+    from tensorflow.keras.utils import set_random_seed
+    from replay import ReplayBuffer
+
+    set_random_seed(seed)
+    model = train.build_model()
+    target_model = train.make_target_model(model)
+    train_step = train.make_train_step(model, target_model)
+    memory = ReplayBuffer(train.memory_size, seed=seed)
+    rng = np.random.default_rng(seed)
+    target_update_every = max(train.target_update_every // train.train_every, 1)
+
+    context = mp.get_context("spawn")
+    weights = SharedWeights(flatten_weights(model.get_weights()).size)
+    weights.publish(flatten_weights(model.get_weights()))
+    queues = [TransitionQueue(queue_slots) for _ in range(number_of_actors)]
+    stats = context.Array("d", 3 * number_of_actors, lock=False)
+    stop = context.Event()
+    actor_seeds = [int(child.generate_state(1)[0]) for child in np.random.SeedSequence(seed).spawn(number_of_actors)]
+    actors = [
+        context.Process(
+            target=actor,
+            args=(actor_id, queues[actor_id], weights, stats, stop, actor_seeds[actor_id], sync_every),
+            name=f"actor-{actor_id}",
+            daemon=True
+        )
+            for actor_id in range(number_of_actors)
+    ]
+
+    received = 0
+    trained = 0
+    start = time.perf_counter()
+    last_report = start
+    try:
+        for process in actors:
+            process.start()
+        while received < total_steps:
+            drained = sum(transitions.drain(memory) for transitions in queues)
+            received += drained
+            if not drained:
+                if not any(process.is_alive() for process in actors):
+                    raise RuntimeError("every actor exited before training finished")
+                time.sleep(0.001)
+                continue
+
+            while len(memory) >= train.batch_size and trained * train.train_every < received:
+                batch = memory.sample(train.batch_size)
+                if train.augment_symmetries:
+                    batch = random_symmetries(*batch, rng)
+                train_step(*batch)
+                trained += 1
+                if trained % target_update_every == 0:
+                    target_model.set_weights(model.get_weights())
+                if trained % publish_every == 0:
+                    weights.publish(flatten_weights(model.get_weights()))
+
+            now = time.perf_counter()
+            if now - last_report >= report_every:
+                report(stats, actors, received, trained, now - start)
+                last_report = now
+    finally:
+        stop.set()
+        for process in actors:
+            process.join(timeout=5)
+        for process in actors:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for transitions in queues:
+            transitions.close()
+            transitions.unlink()
+        weights.close()
+        weights.unlink()
+
+    report(stats, actors, received, trained, time.perf_counter() - start)
+    model.save("cake_sort_model.h5")
+    return model
@@ -0,0 +1,116 @@
+import threading
+import time
+
+class Flight:
+    __slots__ = ("source", "destination", "slice_type", "start", "duration", "sprite")
+
+    def __init__(self, source, destination, slice_type, start, duration):
+        self.source = source
+        self.destination = destination
+        self.slice_type = slice_type
+        self.start = start
+        self.duration = duration
+        self.sprite = None
+
+    def position(self, progress: float) -> tuple[float, float, float]:
+        # x, y and scale of the slice, hopping over the board on its way
+        bounce = 2.5 * (1 - (2 * progress - 1) ** 2)
+        scale = 1 + 0.2 * (1 - abs(2 * progress - 1))
+        x = self.source[0] + (self.destination[0] - self.source[0]) * progress
+        y = self.source[1] + (self.destination[1] - self.source[1]) * progress - 40 * bounce
+        return x, y, scale
+
+class AnimationScheduler:
+    # Flights progress with wall-clock time rather than per frame, so a late frame skips ahead instead of
+    # slowing the animation down. Launching and framing may happen on different threads.
+    def __init__(self, duration: float = 0.45, stagger: float = 0.06, clock=time.perf_counter):
+        self.duration = duration
+        self.stagger = stagger
+        self.clock = clock
+        self.flights = []
+        self.lock = threading.Lock()
+
+    def launch(self, source, destination, slice_type, delay: float = 0.0) -> Flight:
+        flight = Flight(source, destination, int(slice_type), self.clock() + delay, self.duration)
+        with self.lock:
+            self.flights.append(flight)
+        return flight
+
+    def launch_moves(self, moves, position, delay: float = 0.0) -> int:
+        # every moved slice flies at once, slices of the same move a stagger apart; returns the count
+        launched = 0
+        for move in moves:
+            source = position(move["source_row"], move["source_column"])
+            destination = position(move["destination_row"], move["destination_column"])
+            for index in range(move.get("count", 1)):
+                self.launch(source, destination, move["slice_type"], delay + index * self.stagger)
+                launched += 1
+        return launched
+
+    def frame(self) -> tuple[list[tuple[Flight, float]], list[Flight]]:
+        # (started flight, progress) pairs to draw, and the flights that just finished
+        now = self.clock()
+        active = []
+        finished = []
+        with self.lock:
+            remaining = []
+            for flight in self.flights:
+                progress = (now - flight.start) / flight.duration
+                if progress >= 1:
+                    finished.append(flight)
+                    continue
+                remaining.append(flight)
+                if progress >= 0:
+                    active.append((flight, progress))
+            self.flights = remaining
+        return active, finished
+
+    def skip(self):
+        # every flight finishes on the next frame
+        with self.lock:
+            for flight in self.flights:
+                flight.start = -float("inf")
+
+    @property
+    def active(self) -> bool:
+        return bool(self.flights)
+
+class SpritePool:
+    # idle overlay sprites per slice type, so a flight reuses one instead of creating a window or control;
+    # the animation thread acquires and releases while a resize handler may clear
+    def __init__(self, create):
+        self.create = create
+        self.idle = {}
+        # generation each lent sprite was acquired in; clear() starts a new one
+        self.lent = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def acquire(self, slice_type: int):
+        with self.lock:
+            sprites = self.idle.get(slice_type)
+            sprite = sprites.pop() if sprites else None
+            generation = self.generation
+        if sprite is None:
+            sprite = self.create(slice_type)
+        with self.lock:
+            # a sprite created across a clear() may have the old size, so it keeps the old generation
+            self.lent[id(sprite)] = generation
+        return sprite
+
+    def release(self, slice_type: int, sprite) -> bool:
+        # False for a sprite acquired before the last clear(), which the caller should discard
+        with self.lock:
+            if self.lent.pop(id(sprite), self.generation) != self.generation:
+                return False
+            self.idle.setdefault(slice_type, []).append(sprite)
+            return True
+
+    def clear(self) -> list:
+        # forgets the idle sprites and returns them, e.g. to remove them after a resize;
+        # sprites still in flight are refused by release once they land
+        with self.lock:
+            self.generation += 1
+            sprites = [sprite for sprites in self.idle.values() for sprite in sprites]
+            self.idle.clear()
+        return sprites
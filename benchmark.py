@@ -0,0 +1,313 @@
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+import numpy as np
+
+from constants import *
+from env import Env, VecEnv
+from game import CakeSortGame
+from plate import Plate, generate_plates
+from replay import ReplayBuffer
+from policy import epsilon_greedy
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    def register(function):
+        BENCHMARKS[name] = function
+        return function
+    return register
+
+class Skipped(Exception):
+    pass
+
+def legal_cells(game):
+    return list(zip(*np.nonzero(game.board.plate_number_map == 0)))
+
+def play_timed(seed, placements, timed):
+    # plays seeded random games, timing only the place_plate or cleanup_empty_plates calls
+    rng = random.Random(seed)
+    game = CakeSortGame(seed)
+    elapsed = 0.0
+    for _ in range(placements):
+        if not game.current_plates:
+            game.reset_plates()
+        cells = legal_cells(game)
+        if not cells:
+            game = CakeSortGame(rng.getrandbits(32))
+            continue
+        row, column = rng.choice(cells)
+        plate_index = rng.randrange(len(game.current_plates))
+        start = time.perf_counter()
+        game.place_plate(plate_index, row, column)
+        if timed == "place_plate":
+            elapsed += time.perf_counter() - start
+            game.cleanup_empty_plates()
+        else:
+            start = time.perf_counter()
+            game.cleanup_empty_plates()
+            elapsed += time.perf_counter() - start
+    return placements, elapsed
+
+@benchmark("game.place_plate")
+def bench_place_plate(seed, scale):
+    CakeSortGame.transition_cache.clear()
+    return play_timed(seed, 5000 * scale, "place_plate")
+
+@benchmark("game.cleanup_empty_plates")
+def bench_cleanup(seed, scale):
+    return play_timed(seed, 5000 * scale, "cleanup_empty_plates")
+
+@benchmark("plate.generate_plate")
+def bench_generate_plate(seed, scale):
+    rng = np.random.default_rng(seed)
+    count = 20000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        Plate.generate_plate(rng)
+    return count, time.perf_counter() - start
+
+@benchmark("plate.generate_plates")
+def bench_generate_plates(seed, scale):
+    rng = np.random.default_rng(seed)
+    count = 100000 * scale
+    start = time.perf_counter()
+    for _ in range(100):
+        generate_plates(count // 100, rng)
+    return count, time.perf_counter() - start
+
+def random_actions(env, rng):
+    cells = legal_cells(env.game)
+    if not cells:
+        return None
+    row, column = rng.choice(cells)
+    return row * COLS + column
+
+@benchmark("env.step")
+def bench_env_step(seed, scale):
+    rng = random.Random(seed)
+    env = Env(seed=seed)
+    env.reset()
+    count = 5000 * scale
+    elapsed = 0.0
+    for _ in range(count):
+        action = random_actions(env, rng)
+        if action is None:
+            env.reset()
+            continue
+        start = time.perf_counter()
+        env.step(action)
+        elapsed += time.perf_counter() - start
+    return count, elapsed
+
+@benchmark("env.get_state")
+def bench_env_get_state(seed, scale):
+    env = Env(seed=seed)
+    env.reset()
+    count = 20000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        env.get_state()
+    return count, time.perf_counter() - start
+
+@benchmark("policy.epsilon_greedy[64]")
+def bench_epsilon_greedy(seed, scale, number_of_envs=64):
+    # action selection for a batch of envs, with a fixed linear layer standing in for the network
+    rng = np.random.default_rng(seed)
+    env = VecEnv(number_of_envs, seed)
+    states = env.reset()
+    masks = env.get_action_mask()
+    weights = rng.normal(size=(STATE_SIZE, ROWS * COLS)).astype(np.float32)
+    q_function = lambda states: states @ weights
+    count = 2000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        epsilon_greedy(q_function, states, masks, 0.5, rng)
+    return count * number_of_envs, time.perf_counter() - start
+
+def collect_transitions(seed, count):
+    rng = random.Random(seed)
+    env = Env(seed=seed)
+    state = env.reset().copy()
+    transitions = []
+    while len(transitions) < count:
+        action = random_actions(env, rng)
+        if action is None:
+            state = env.reset().copy()
+            continue
+        next_state, score, bonus, done = env.step(action)
+        transitions.append((state, action, score + bonus, next_state.copy(), done))
+        state = transitions[-1][3]
+        if done:
+            state = env.reset().copy()
+    return transitions
+
+@benchmark("train.replay_sample")
+def bench_replay_sample(seed, scale, batch_size=64):
+    # ReplayBuffer minibatch assembly as used by train.py
+    memory = ReplayBuffer(20000, seed=seed)
+    for transition in collect_transitions(seed, 20000):
+        memory.add(*transition)
+    count = 2000 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        memory.sample(batch_size)
+    return count, time.perf_counter() - start
+
+def train_setup(seed):
+    try:
+        import train
+    except ImportError as error:
+        raise Skipped(f"TensorFlow is not installed ({error})")
+    memory = ReplayBuffer(20000, seed=seed)
+    for transition in collect_transitions(seed, 2000):
+        memory.add(*transition)
+    return train, train.build_model(), memory
+
+@benchmark("train.step")
+def bench_train_step(seed, scale, batch_size=64):
+    # one compiled gradient step of train.py on a replayed minibatch
+    train, model, memory = train_setup(seed)
+    train_step = train.make_train_step(model, train.make_target_model(model))
+    train_step(*memory.sample(batch_size))
+    count = 200 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        train_step(*memory.sample(batch_size))
+    return count, time.perf_counter() - start
+
+@benchmark("train.predict_fit")
+def bench_train_predict_fit(seed, scale, batch_size=64):
+    # the update train.py used to run every env step, for comparison with train.step:
+    # two predict calls, a Python loop over the batch and a fit call
+    train, model, memory = train_setup(seed)
+
+    def update():
+        states, actions, rewards, next_states, dones = memory.sample(batch_size)
+        targets = model.predict(states, verbose=0)
+        targets_next = model.predict(next_states, verbose=0)
+        for i, (a, r, d) in enumerate(zip(actions, rewards, dones)):
+            targets[i][a] = r if d else r + train.gamma * np.max(targets_next[i])
+        model.fit(states, targets, epochs=1, verbose=0)
+
+    update()
+    count = 20 * scale
+    start = time.perf_counter()
+    for _ in range(count):
+        update()
+    return count, time.perf_counter() - start
+
+def load_keras_model(path="cake_sort_model.h5"):
+    import numpy_model
+    try:
+        return numpy_model.load_keras_model(path)
+    except ImportError as error:
+        raise Skipped(f"TensorFlow is not installed ({error})")
+    except (OSError, ValueError) as error:
+        # missing, unreadable or incompatible model file
+        raise Skipped(f"cannot load {path} ({error})")
+
+@benchmark("model.predict[1]")
+def bench_predict_single(seed, scale):
+    model = load_keras_model()
+    states = np.random.default_rng(seed).integers(0, 7, (200 * scale, model.input_shape[1]))
+    model.predict(states[:1], verbose=0)
+    start = time.perf_counter()
+    for state in states:
+        model.predict(state[np.newaxis], verbose=0)
+    return len(states), time.perf_counter() - start
+
+@benchmark("model.predict[64]")
+def bench_predict_batch(seed, scale, batch_size=64):
+    model = load_keras_model()
+    states = np.random.default_rng(seed).integers(0, 7, (50 * scale, batch_size, model.input_shape[1]))
+    model.predict(states[0], verbose=0)
+    start = time.perf_counter()
+    for batch in states:
+        model.predict(batch, verbose=0)
+    return len(states) * batch_size, time.perf_counter() - start
+
+def run(names, seed, scale, repeat):
+    results = {}
+    for name in names:
+        try:
+            # best of the repeats, which is the least noisy estimate of the cost
+            runs = [BENCHMARKS[name](seed, scale) for _ in range(repeat)]
+        except Skipped as reason:
+            results[name] = {"skipped": str(reason)}
+            print(f"{name:<28} skipped: {reason}")
+            continue
+        ops, seconds = min(runs, key=lambda run: run[1] / run[0])
+        results[name] = {
+            "ops": ops,
+            "seconds": seconds,
+            "ops_per_sec": ops / seconds if seconds else float("inf"),
+            "us_per_op": 1e6 * seconds / ops
+        }
+        print(f"{name:<28} {results[name]['us_per_op']:>12.3f} us/op {results[name]['ops_per_sec']:>14.1f} ops/s")
+    return results
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    print(f"\n{'benchmark':<28} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, result in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if "us_per_op" not in result or not previous or "us_per_op" not in previous:
+            continue
+        ratio = result["us_per_op"] / previous["us_per_op"]
+        flag = " REGRESSION" if ratio > 1 + tolerance else ""
+        print(f"{name:<28} {previous['us_per_op']:>12.3f} {result['us_per_op']:>12.3f} {ratio:>8.2f}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the engine, environment and training hot paths.")
+    parser.add_argument("benchmarks", nargs="*", help=f"subset to run, from: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=int, default=1, help="multiplies the number of operations per benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="also write the results to --baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown before a regression is reported")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(unknown)}")
+
+    results = run(args.benchmarks or list(BENCHMARKS), args.seed, args.scale, args.repeat)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "seed": args.seed,
+            "scale": args.scale,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    regressions = []
+    if args.baseline:
+        if args.save_baseline:
+            with open(args.baseline, "w") as file:
+                json.dump(report, file, indent=2)
+        else:
+            with open(args.baseline) as file:
+                regressions = compare(results, json.load(file), args.tolerance)
+            if regressions:
+                print(f"\nRegressions: {', '.join(regressions)}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
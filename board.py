@@ -1,5 +1,8 @@
+from __future__ import annotations
+
 from constants import *
 from plate import Plate
+from encoding import ZOBRIST_CELLS, code_hash, unpack_codes
 
 import numpy as np
 
@@ -7,12 +10,17 @@ class Board:
     def __init__(self):
         self.grid = [[Plate(np.array([]))] * COLS for _ in range(ROWS)]
         self.plate_number_map = np.zeros((ROWS, COLS), dtype=int)
+        # packed contents of every cell, kept in sync by place_plate/remove_plate/refresh_cell
+        self.cell_codes = [0] * (ROWS * COLS)
+        self.key = 0
+        self.zobrist = 0
 
     def place_plate(self, row: int, column: int, plate_number: int, plate: Plate) -> bool:
         if self.plate_number_map[row, column]:
             return False
         self.grid[row][column] = plate
         self.plate_number_map[row, column] = plate_number
+        self.refresh_cell(row, column)
         return True
 
     def get_plate_number(self, row: int, column: int) -> int:
@@ -24,16 +32,65 @@ class Board:
     def remove_plate(self, row, col):
         self.grid[row][col] = Plate(np.array([]))
         self.plate_number_map[row, col] = 0
-    
+        self.__set_code(row * COLS + col, 0)
+
+    def refresh_cell(self, row: int, column: int):
+        self.__set_code(row * COLS + column, self.grid[row][column].code)
+
+    def __set_code(self, index: int, code: int):
+        # rows and columns may arrive as NumPy integers, which cannot shift past 64 bits
+        index = int(index)
+        old_code = self.cell_codes[index]
+        if old_code == code:
+            return
+        self.cell_codes[index] = code
+        self.key ^= (old_code ^ code) << (index * PLATE_BITS)
+        self.zobrist ^= code_hash(ZOBRIST_CELLS[index], old_code) ^ code_hash(ZOBRIST_CELLS[index], code)
+
+    def restore(self, cell_codes: tuple[int, ...], plate_numbers: tuple[int, ...], key: int, zobrist: int):
+        self.grid = [
+            [
+                Plate.from_code(cell_codes[row * COLS + column])
+                    if plate_numbers[row * COLS + column] else Plate(())
+                    for column in range(COLS)
+            ]
+                for row in range(ROWS)
+        ]
+        self.plate_number_map = np.array(plate_numbers, dtype=int).reshape(ROWS, COLS)
+        self.cell_codes = list(cell_codes)
+        self.key = key
+        self.zobrist = zobrist
+
     @staticmethod
-    def get_neighbors_indexes(row: int, column: int) -> list[tuple[int,int]]:
-        neighbors = []
-        if row < ROWS - 1:
-            neighbors.append((row + 1, column))
-        if row > 0:
-            neighbors.append((row - 1, column))
-        if column > 0:
-            neighbors.append((row, column - 1))
-        if column < COLS - 1:
-            neighbors.append((row, column + 1))
-        return neighbors
+    def from_key(key: int) -> Board:
+        board = Board()
+        plate_number = 1
+        for index, code in enumerate(unpack_codes(key, ROWS * COLS)):
+            if code:
+                board.place_plate(*divmod(index, COLS), plate_number, Plate.from_code(code))
+                plate_number += 1
+        return board
+
+    @staticmethod
+    def get_neighbors_indexes(row: int, column: int) -> tuple[tuple[int,int], ...]:
+        return NEIGHBORS[row][column]
+
+def _neighbors_indexes(row: int, column: int) -> tuple[tuple[int,int], ...]:
+    neighbors = []
+    if row < ROWS - 1:
+        neighbors.append((row + 1, column))
+    if row > 0:
+        neighbors.append((row - 1, column))
+    if column > 0:
+        neighbors.append((row, column - 1))
+    if column < COLS - 1:
+        neighbors.append((row, column + 1))
+    return tuple(neighbors)
+
+# adjacency of every cell, in the order the merge rules visit neighbours
+NEIGHBORS = tuple(tuple(_neighbors_indexes(row, column) for column in range(COLS)) for row in range(ROWS))
+NEIGHBOR_CELLS = tuple(
+    tuple(neighbor_row * COLS + neighbor_column for neighbor_row, neighbor_column in NEIGHBORS[row][column])
+        for row in range(ROWS)
+            for column in range(COLS)
+)
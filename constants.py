@@ -9,3 +9,10 @@ CAKE_TYPE_COLORS = {
     5: "#32CD32",
     6: "#A020F0"
 }
+PLATES_PER_HAND = 3
+SLICE_BITS = 3
+PLATE_BITS = SLICE_BITS * MAX_SLICES_PER_PLATE
+BOARD_KEY_BITS = ROWS * COLS * PLATE_BITS
+SLICE_MASK = (1 << SLICE_BITS) - 1
+BOARD_STATE_SIZE = ROWS * COLS * MAX_SLICES_PER_PLATE
+STATE_SIZE = BOARD_STATE_SIZE + MAX_SLICES_PER_PLATE - 1
@@ -0,0 +1,38 @@
+import random
+
+from constants import *
+
+# Zobrist tables: one random 64-bit word per (slot, slice type) of every board
+# cell and hand position. Entry 0 (empty slot) is zero so empty plates hash to 0.
+_zobrist_rng = random.Random(0xCA4E5)
+
+def _zobrist_table(positions):
+    return [
+        [
+            [0] + [_zobrist_rng.getrandbits(64) for _ in range(SLICE_MASK)]
+            for _ in range(MAX_SLICES_PER_PLATE)
+        ]
+        for _ in range(positions)
+    ]
+
+ZOBRIST_CELLS = _zobrist_table(ROWS * COLS)
+ZOBRIST_HAND = _zobrist_table(PLATES_PER_HAND)
+
+def code_hash(table: list[list[int]], code: int) -> int:
+    value = 0
+    for slot in table:
+        if not code:
+            break
+        value ^= slot[code & SLICE_MASK]
+        code >>= SLICE_BITS
+    return value
+
+def pack_codes(codes) -> int:
+    key = 0
+    for index, code in enumerate(codes):
+        key |= code << (index * PLATE_BITS)
+    return key
+
+def unpack_codes(key: int, count: int) -> list[int]:
+    plate_mask = (1 << PLATE_BITS) - 1
+    return [(key >> (index * PLATE_BITS)) & plate_mask for index in range(count)]
@@ -1,21 +1,33 @@
-from itertools import product
-
 import numpy as np
 
 from constants import *
 
+SLOT_SHIFTS = np.arange(MAX_SLICES_PER_PLATE) * SLICE_BITS
+SLICE_TYPE_VALUES = np.arange(1, len(CAKE_SLICE_TYPES) + 1)
+
 class Env:
-    def __init__(self,game=None):
+    def __init__(self,game=None,seed=None):
         from game import CakeSortGame
-        self.game = CakeSortGame() if game is None else game
+        # every reset draws its game seed from this stream, so a seeded Env replays the same games
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.game = CakeSortGame(self.seed_sequence.spawn(1)[0]) if game is None else game
         self.plate_index = 0
+        # observation buffer, kept in sync with the board cell by cell through the packed cell codes
+        self.observation = np.zeros(STATE_SIZE,dtype=np.uint8)
+        self.observation_view = self.observation.view()
+        self.observation_view.flags.writeable = False
+        self.encoded_codes = [0]*(ROWS*COLS)
+        self.encoded_key = 0
+        self.touched_cells = None
 
     def set_plate_index(self,index):
         self.plate_index = index
 
-    def reset(self):
+    def reset(self,seed=None):
         from game import CakeSortGame
-        self.game = CakeSortGame()
+        if seed is not None:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.game = CakeSortGame(self.seed_sequence.spawn(1)[0])
         return self.get_state()
 
     def step(self,action):
@@ -26,8 +38,12 @@ class Env:
         if self.game.board.get_plate_number(row,column):
             return self.get_state(),-10 if self.get_empty_spaces() else 0,0,True
   
-        self.game.place_plate(self.plate_index,row,column)
+        moves = self.game.place_plate(self.plate_index,row,column)
         self.game.cleanup_empty_plates()
+        self.touched_cells = [(row,column)]
+        for move in moves:
+            self.touched_cells.append((move["source_row"],move["source_column"]))
+            self.touched_cells.append((move["destination_row"],move["destination_column"]))
         
         return\
             self.get_state(),\
@@ -36,18 +52,85 @@ class Env:
             False
 
     def get_state(self):
-        state = []
-        for i,j in product(range(ROWS),range(COLS)):
-            slices = self.game.board.grid[i][j].slices
-            state.append(list(slices)+[0]*(MAX_SLICES_PER_PLATE-len(slices)))
-
+        # read-only view of the shared buffer: copy it to keep a state across steps
         if not self.game.current_plates:
             self.game.reset_plates()
-            
-        plate = self.game.current_plates[0]
-        state.append(list(plate.slices)+[0]*(MAX_SLICES_PER_PLATE-len(plate.slices)-1))
+        self.__sync_board()
+        code = self.game.current_plates[0].code
+        self.observation[BOARD_STATE_SIZE:] = (code >> SLOT_SHIFTS[:-1]) & SLICE_MASK
+        return self.observation_view
+
+    def get_encoded_board(self,encoding="counts"):
+        self.__sync_board()
+        slots = self.observation[:BOARD_STATE_SIZE].reshape(ROWS,COLS,MAX_SLICES_PER_PLATE)
+        one_hot = slots[...,np.newaxis] == SLICE_TYPE_VALUES
+        if encoding == "onehot":
+            return one_hot.astype(np.uint8)
+        if encoding == "counts":
+            return one_hot.sum(axis=2,dtype=np.uint8)
+        raise ValueError(f"Unknown board encoding {encoding!r}")
+
+    def __sync_board(self):
+        board = self.game.board
+        if self.touched_cells is not None:
+            for row,column in self.touched_cells:
+                index = int(row)*COLS+int(column)
+                self.__encode_cell(index,board.cell_codes[index])
+            self.touched_cells = None
+        # a new game, a restore or an outside move: fall back to comparing every cell
+        if board.key != self.encoded_key:
+            for index,code in enumerate(board.cell_codes):
+                self.__encode_cell(index,code)
+
+    def __encode_cell(self,index,code):
+        old_code = self.encoded_codes[index]
+        if old_code == code:
+            return
+        self.encoded_codes[index] = code
+        self.encoded_key ^= (old_code^code) << (index*PLATE_BITS)
+        self.observation[index*MAX_SLICES_PER_PLATE:(index+1)*MAX_SLICES_PER_PLATE] = (code >> SLOT_SHIFTS) & SLICE_MASK
 
-        return np.concatenate(state)
-    
     def get_empty_spaces(self):
         return sum(self.game.board.plate_number_map.flatten() == 0)
+
+    def get_action_mask(self):
+        return self.game.board.plate_number_map.reshape(-1) == 0
+
+class VecEnv:
+    def __init__(self,number_of_envs,seed=None):
+        from vec_game import VecCakeSortGame
+        self.game = VecCakeSortGame(number_of_envs,seed)
+        self.plate_index = np.zeros(number_of_envs,dtype=np.intp)
+
+    def set_plate_index(self,index):
+        self.plate_index[:] = index
+
+    def reset(self,mask=None):
+        self.game.reset(mask)
+        return self.get_state()
+
+    def step(self,actions):
+        score = self.game.score.copy()
+        interacted_slices = self.game.interacted_slices.copy()
+        rows,columns = np.divmod(np.asarray(actions),COLS)
+
+        done = self.game.occupied[np.arange(self.game.number_of_games),rows,columns]
+        penalty = np.where(self.get_empty_spaces() > 0,-10,0)
+
+        self.game.place_plate(self.plate_index,rows,columns,~done)
+        self.game.cleanup_empty_plates()
+
+        return\
+            self.get_state(),\
+            np.where(done,penalty,self.game.score-score),\
+            0.1*(self.game.interacted_slices-interacted_slices),\
+            done
+
+    def get_state(self):
+        return self.game.get_states(self.plate_index)
+
+    def get_empty_spaces(self):
+        return self.game.get_empty_spaces()
+
+    def get_action_mask(self):
+        return ~self.game.cell_occupied
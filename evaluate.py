@@ -0,0 +1,204 @@
+import argparse
+import importlib
+import json
+import math
+import multiprocessing as mp
+import sys
+import time
+
+import numpy as np
+
+from constants import *
+from game import CakeSortGame
+
+def legal_cells(game) -> np.ndarray:
+    return np.argwhere(game.board.plate_number_map == 0)
+
+def random_policy(game, rng):
+    cells = legal_cells(game)
+    if not len(cells):
+        return None
+    row, column = cells[rng.integers(len(cells))]
+    return int(rng.integers(len(game.current_plates))), int(row), int(column)
+
+def greedy_policy(game, rng):
+    # best immediate score plus interaction bonus, ties broken at random
+    cells = legal_cells(game)
+    if not len(cells):
+        return None
+    state = game.snapshot()
+    best_moves = []
+    best_value = -math.inf
+    seen_plates = set()
+    for plate_index, plate in enumerate(game.current_plates):
+        if plate.code in seen_plates:
+            continue
+        seen_plates.add(plate.code)
+        for row, column in cells.tolist():
+            game.place_plate(plate_index, row, column)
+            game.cleanup_empty_plates()
+            value = game.score - state.score + 0.1 * (game.interacted_slices - state.interacted_slices)
+            game.restore(state)
+            if value > best_value:
+                best_value = value
+                best_moves = [(plate_index, row, column)]
+            elif value == best_value:
+                best_moves.append((plate_index, row, column))
+    return best_moves[rng.integers(len(best_moves))]
+
+def dqn_policy(path="cake_sort_model.npz"):
+    from numpy_model import NumpyModel
+    from hints import HintService
+
+    hint_service = HintService(NumpyModel.load(path))
+
+    def policy(game, rng):
+        placement = hint_service.best(game)
+        return None if placement is None else placement[:3]
+    return policy
+
+def expectimax_policy(nodes="2000"):
+    from hint_engine import HintEngine
+
+    # a node budget instead of a time budget keeps the games reproducible
+    engine = HintEngine(time_budget=math.inf, node_budget=int(nodes))
+
+    def policy(game, rng):
+        engine.rng = rng
+        hint = engine.best_move(game)
+        return None if hint is None else hint[:3]
+    return policy
+
+POLICIES = {
+    "random": lambda: random_policy,
+    "greedy": lambda: greedy_policy,
+    "dqn": dqn_policy,
+    "expectimax": expectimax_policy
+}
+
+def make_policy(spec: str):
+    # "name", "name=argument" or "module:function" for any callable taking (game, rng)
+    if ":" in spec:
+        module_name, function_name = spec.split(":", 1)
+        return getattr(importlib.import_module(module_name), function_name)
+    name, _, argument = spec.partition("=")
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy {spec!r}, expected one of {', '.join(POLICIES)} or module:function")
+    return POLICIES[name](argument) if argument else POLICIES[name]()
+
+def play(policy, seed: int, game_index: int, max_moves: int) -> tuple[int, int, float]:
+    game = CakeSortGame([seed, game_index])
+    rng = np.random.default_rng([seed, game_index, 1])
+    moves = 0
+    start = time.perf_counter()
+    while moves < max_moves:
+        if not game.current_plates:
+            game.reset_plates()
+        move = policy(game, rng)
+        if move is None:
+            break
+        game.place_plate(*move)
+        game.cleanup_empty_plates()
+        moves += 1
+    return game.score, moves, time.perf_counter() - start
+
+_worker_policies = None
+
+def _init_worker(specs):
+    global _worker_policies
+    _worker_policies = [make_policy(spec) for spec in specs]
+
+def _play_chunk(task):
+    policy_index, seed, game_indexes, max_moves = task
+    policy = _worker_policies[policy_index]
+    return policy_index, [(game_index, *play(policy, seed, game_index, max_moves)) for game_index in game_indexes]
+
+def evaluate(specs, games=1000, seed=0, processes=None, max_moves=1000, chunk_size=25):
+    # every policy plays the same seeded games, so their results can be compared pairwise
+    results = {index: np.zeros((games, 3)) for index in range(len(specs))}
+    tasks = [
+        (policy_index, seed, range(start, min(start + chunk_size, games)), max_moves)
+            for policy_index in range(len(specs))
+                for start in range(0, games, chunk_size)
+    ]
+    start = time.perf_counter()
+    if processes == 1:
+        _init_worker(specs)
+        chunks = map(_play_chunk, tasks)
+        for policy_index, rows in chunks:
+            for game_index, *row in rows:
+                results[policy_index][game_index] = row
+    else:
+        with mp.Pool(processes, initializer=_init_worker, initargs=(specs,)) as pool:
+            for policy_index, rows in pool.imap_unordered(_play_chunk, tasks):
+                for game_index, *row in rows:
+                    results[policy_index][game_index] = row
+    return results, time.perf_counter() - start
+
+def confidence_interval(values: np.ndarray, z: float = 1.96) -> tuple[float, float]:
+    # normal approximation of the mean's 95% interval
+    half_width = z * values.std(ddof=1) / math.sqrt(len(values)) if len(values) > 1 else math.nan
+    return values.mean() - half_width, values.mean() + half_width
+
+def summarize(rows: np.ndarray) -> dict[str, float]:
+    scores, moves, seconds = rows.T
+    low, high = confidence_interval(scores)
+    percentiles = np.percentile(scores, [5, 25, 50, 75, 95])
+    return {
+        "games": len(rows),
+        "score_mean": scores.mean(),
+        "score_ci95": [low, high],
+        "score_std": scores.std(ddof=1) if len(rows) > 1 else math.nan,
+        "score_min": scores.min(),
+        "score_p5": percentiles[0],
+        "score_p25": percentiles[1],
+        "score_median": percentiles[2],
+        "score_p75": percentiles[3],
+        "score_p95": percentiles[4],
+        "score_max": scores.max(),
+        "moves_mean": moves.mean(),
+        "moves_ci95": list(confidence_interval(moves)),
+        "moves_per_second": moves.sum() / seconds.sum() if seconds.sum() else math.inf
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play seeded games headlessly and compare policies.")
+    parser.add_argument(
+        "policies", nargs="*", default=["random"],
+        help="random, greedy, dqn[=model.npz|model.h5], expectimax[=nodes] or module:function taking (game, rng)"
+    )
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="worker processes, all cores by default")
+    parser.add_argument("--max-moves", type=int, default=1000, help="cap on the placements of one game")
+    parser.add_argument("--json", help="also write the summaries to this file")
+    args = parser.parse_args(argv)
+
+    results, elapsed = evaluate(args.policies, args.games, args.seed, args.processes, args.max_moves)
+    summaries = {}
+    baseline = results[0][:, 0]
+    for index, spec in enumerate(args.policies):
+        summary = summarize(results[index])
+        summaries[spec] = summary
+        print(
+            f"{spec}: score {summary['score_mean']:.2f} "
+            f"[{summary['score_ci95'][0]:.2f}, {summary['score_ci95'][1]:.2f}], "
+            f"median {summary['score_median']:.0f}, p5-p95 {summary['score_p5']:.0f}-{summary['score_p95']:.0f}, "
+            f"max {summary['score_max']:.0f}, moves {summary['moves_mean']:.1f}, "
+            f"{summary['moves_per_second']:.0f} moves/s per process"
+        )
+        if index:
+            # same seeds for every policy, so the paired difference has a much tighter interval
+            low, high = confidence_interval(results[index][:, 0] - baseline)
+            summary["score_difference_ci95"] = [low, high]
+            print(f"  vs {args.policies[0]}: {summary['score_mean'] - summaries[args.policies[0]]['score_mean']:+.2f} [{low:+.2f}, {high:+.2f}]")
+    total_moves = sum(rows[:, 1].sum() for rows in results.values())
+    print(f"{len(args.policies) * args.games} games, {total_moves:.0f} moves in {elapsed:.1f} s ({total_moves / elapsed:.0f} moves/s)")
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump({"seed": args.seed, "games": args.games, "elapsed": elapsed, "policies": summaries}, file, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
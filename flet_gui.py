@@ -1,17 +1,22 @@
-import pickle
-import io
-import base64
-from PIL import Image, ImageDraw
-import flet as ft
-from env import Env
-from game import CakeSortGame
-from plate import Plate  
-from constants import ROWS, COLS  
-from constants import MAX_SLICES_PER_PLATE, CAKE_TYPE_COLORS
-import asyncio
+from startup import STARTUP, BackgroundTask, print_startup_report
+with STARTUP.phase("import PIL"):
+    from PIL import Image
+    from sprites import SpriteCache
+with STARTUP.phase("import flet"):
+    import flet as ft
+with STARTUP.phase("import engine"):
+    from hints import HintService
+    from animation import AnimationScheduler, SpritePool
+    from game import CakeSortGame
+    from savegame import GameJournal, SaveWriter, apply, capture, load_journal, load_snapshot
+    from plate import Plate  
+    from constants import ROWS, COLS  
 import numpy as np
+import atexit
 import os
-from tensorflow.keras.models import load_model
+import threading
+import time
+from collections import deque
 
 TEXTURE_FILES = [
     "textures/cereals.jpg",
@@ -21,49 +26,34 @@ TEXTURE_FILES = [
     "textures/tiramisu.jpg",
     "textures/waffle.jpg"
 ]
-TEXTURES = [Image.open(fname).convert("RGBA") for fname in TEXTURE_FILES]
+# textures arrive from a background task; until then plates are drawn with flat colours
+SPRITES = SpriteCache()
 
+def load_textures():
+    return [Image.open(fname).convert("RGBA") for fname in TEXTURE_FILES]
 
+def load_hint_service():
+    from numpy_model import NumpyModel
+    model = NumpyModel.load("cake_sort_model.npz" if os.path.exists("cake_sort_model.npz") else "cake_sort_model.h5")
+    return HintService(model)
 
-def draw_plate_flet(plate, size=60):
-    n = len(plate.slices)
-    img = Image.new("RGBA", (size, size), (255, 255, 255, 0))
-    cx, cy = size // 2, size // 2
-
-    slices = list(plate.slices)
-    while len(slices) < MAX_SLICES_PER_PLATE:
-        slices.append(None)
-
-    angle_per_slice = 360 / MAX_SLICES_PER_PLATE
-    start_angle = 0
-    for idx, slice_type in enumerate(slices):
-        end_angle = start_angle + angle_per_slice
-       
-        mask = Image.new("L", (size, size), 0)
-        mask_draw = ImageDraw.Draw(mask)
-        mask_draw.pieslice([2, 2, size-2, size-2], start=start_angle, end=end_angle, fill=255)
-        if slice_type is not None:
-            texture_idx = int(slice_type) - 1
-            if 0 <= texture_idx < len(TEXTURES):
-                texture = TEXTURES[texture_idx].resize((size, size))
-                img.paste(texture, (0, 0), mask)
-            else:
-                color = CAKE_TYPE_COLORS.get(int(slice_type), "#888888")
-                color_img = Image.new("RGBA", (size, size), color)
-                img.paste(color_img, (0, 0), mask)
-        start_angle = end_angle
 
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    data = base64.b64encode(buf.getvalue()).decode()
-    return ft.Image(src_base64=data, width=size, height=size)
+
+def draw_plate_flet(plate, size=60):
+    return ft.Image(src_base64=SPRITES.get(plate, size), width=size, height=size)
 
 BOARD_HEIGHT_RATIO = 0.7
+ANIMATION_FRAME = 1 / 60
+UNDO_DEPTH = 64
 
 def main(page: ft.Page):
+    main_start = time.perf_counter()
     temp_dir = os.path.join(os.path.dirname(__file__), "temp")
     os.makedirs(temp_dir, exist_ok=True)
-    model = load_model("cake_sort_model.h5")
+    def on_hints_ready(hint_service):
+        print("Hints ready")
+        print_startup_report("Model loaded")
+    hint_task = BackgroundTask("load model", load_hint_service, on_ready=on_hints_ready)
     try:
         for fname in os.listdir(temp_dir):
             fpath = os.path.join(temp_dir, fname)
@@ -89,23 +79,28 @@ def main(page: ft.Page):
 
     game = CakeSortGame()
     while len(game.current_plates) < 3:
-        game.current_plates.append(Plate.generate_plate())
-
-    autosave_counter = [1]  
-
-    def autosave_game():
-        for i in range(len(game.current_plates)):
-            print(f"Plate{i}")
-            env = Env(game)
-            env.set_plate_index(i)
-            action = np.argmax((model.predict(env.get_state()[np.newaxis], verbose=0)[0]))
-            score = np.max((model.predict(env.get_state()[np.newaxis], verbose=0)[0]))
-            row,column = divmod(action,COLS)
-            print(f"{row=},{column=},{score=}")
-        filename = os.path.join(temp_dir, f"autosave_{autosave_counter[0]}.pkl")
-        with open(filename, "wb") as f:
-            pickle.dump(game, f)
-        autosave_counter[0] += 1
+        game.current_plates.append(Plate.generate_plate(game.rng))
+
+    save_writer = SaveWriter()
+    atexit.register(save_writer.close)
+    journal = GameJournal(os.path.join(temp_dir, "autosave.journal"), save_writer)
+    # states after each move, newest last; undo steps back through them without touching the disk
+    history = deque(maxlen=UNDO_DEPTH)
+
+    def autosave_game(move=None):
+        if hint_task.ready:
+            for i in range(len(game.current_plates)):
+                print(f"Plate{i}")
+                hint = hint_task.result.best(game, i)
+                if hint is not None:
+                    print(f"row={hint.row},column={hint.column},score={hint.q_value}")
+        else:
+            print("Hints warming up")
+        history.append(capture(game))
+        if move is None:
+            journal.checkpoint(game)
+        else:
+            journal.record_move(game, *move)
 
     # Autosave la începutul jocului
     autosave_game()
@@ -132,37 +127,67 @@ def main(page: ft.Page):
     def make_select_plate(idx):
         return lambda e: select_plate(idx)
 
+    # board and hand redraws come from event handlers and background tasks, so they take turns
+    ui_lock = threading.RLock()
+
+    def with_ui_lock(function):
+        def locked(*args):
+            with ui_lock:
+                return function(*args)
+        return locked
+
+    # occupancy and packed plate code each board cell was last drawn with, None when it must be redrawn
+    cell_signatures = [[None for _ in range(COLS)] for _ in range(ROWS)]
+    rendered_cell_size = [None]
+
+    def invalidate_board():
+        for signatures in cell_signatures:
+            signatures[:] = [None] * COLS
+
+    def draw_cell_content(r, c, cell_size):
+        plate_number = game.board.get_plate_number(r, c)
+        if plate_number:
+            plate = game.placed_plates[plate_number]
+            return draw_plate_flet(plate, size=cell_size)  
+        return ft.Container(width=cell_size, height=cell_size, bgcolor="#eee", border_radius=cell_size//2)
+
+    @with_ui_lock
     def update_board():
         board_column.height = int(page.height * BOARD_HEIGHT_RATIO)
-        board_column.controls.clear()
         cell_size = get_cell_size()
+        if cell_size != rendered_cell_size[0] or not board_column.controls:
+            # the layout changed, so every cell control is rebuilt
+            rendered_cell_size[0] = cell_size
+            invalidate_board()
+            board_column.controls.clear()
+            for r in range(ROWS):
+                row_controls = []
+                for c in range(COLS):
+                    cell = ft.Container(
+                        width=cell_size,
+                        height=cell_size,
+                        border=ft.border.all(2, "black"),
+                        alignment=ft.alignment.center,
+                        on_click=make_place_plate(r, c),
+                        margin=CELL_MARGIN//2
+                    )
+                    board_cells[r][c] = cell
+                    row_controls.append(cell)
+                board_column.controls.append(ft.Row(row_controls, spacing=0))
+        # only cells whose contents changed get new content, so page.update sends just those
         for r in range(ROWS):
-            row_controls = []
             for c in range(COLS):
-                plate_number = game.board.get_plate_number(r, c)
-                if plate_number:
-                    plate = game.placed_plates[plate_number]
-                    label = draw_plate_flet(plate, size=cell_size)  
-                else:
-                    label = ft.Container(width=cell_size, height=cell_size, bgcolor="#eee", border_radius=cell_size//2)
-                cell = ft.Container(
-                    content=label,
-                    width=cell_size,
-                    height=cell_size,
-                    border=ft.border.all(2, "black"),
-                    alignment=ft.alignment.center,
-                    on_click=make_place_plate(r, c),
-                    margin=CELL_MARGIN//2
-                )
-                board_cells[r][c] = cell
-                row_controls.append(cell)
-            board_column.controls.append(ft.Row(row_controls, spacing=0))
+                signature = (game.board.get_plate_number(r, c) != 0, game.board.cell_codes[r * COLS + c])
+                if signature != cell_signatures[r][c]:
+                    board_cells[r][c].content = draw_cell_content(r, c, cell_size)
+                    cell_signatures[r][c] = signature
         score_text.value = f"Score: {game.score}"
         page.update()
 
         if is_board_full() and len(game.current_plates) > 0:
             show_game_over()
 
+    @with_ui_lock
     def update_plates():
         plates_row.controls.clear()
         plate_cells.clear()
@@ -185,51 +210,68 @@ def main(page: ft.Page):
         selected_plate_index[0] = idx
         update_plates()
 
-    async def animate_slice_move(src_widget, dst_widget, slice_type):
-        def get_cell_pos(widget):
-            for r in range(ROWS):
-                for c in range(COLS):
-                    if board_cells[r][c] is widget:
-                        return get_board_cell_position(r, c)
-            for i, cell in enumerate(plate_cells):
-                if cell is widget:
-                    plate_size = get_plate_size()
-                    plates_row_width = len(plate_cells) * plate_size + (len(plate_cells) + 1) * CELL_MARGIN
-                    offset_x = (page.width - plates_row_width) // 2 + CELL_MARGIN + i * (plate_size + CELL_MARGIN)
-                    board_height = ROWS * get_cell_size() + (ROWS + 1) * CELL_MARGIN
-                    offset_y = (page.height - board_height) // 2 + board_height + int(page.height * 0.05) + CELL_MARGIN
-                    return offset_x, offset_y
-            return (0, 0)
-
-        src_left, src_top = get_cell_pos(src_widget)
-        dst_left, dst_top = get_cell_pos(dst_widget)
-
-        img = draw_plate_flet(Plate(np.array([slice_type])), size=get_cell_size())
-        anim = ft.Container(content=img, left=src_left, top=src_top, width=get_cell_size(), height=get_cell_size())
-        overlay.controls.append(anim)
-        page.update()
+    def get_hand_plate_position(i):
+        plate_size = get_plate_size()
+        plates_row_width = len(plate_cells) * plate_size + (len(plate_cells) + 1) * CELL_MARGIN
+        offset_x = (page.width - plates_row_width) // 2 + CELL_MARGIN + i * (plate_size + CELL_MARGIN)
+        board_height = ROWS * get_cell_size() + (ROWS + 1) * CELL_MARGIN
+        offset_y = (page.height - board_height) // 2 + board_height + int(page.height * 0.05) + CELL_MARGIN
+        return offset_x, offset_y
+
+    def get_flight_position(row, col):
+        if row == -1:
+            return get_hand_plate_position(selected_plate_index[0])
+        return get_board_cell_position(row, col)
 
-        steps = 20
-        for i in range(steps + 1):
-            t = i / steps
-            anim.left = src_left + (dst_left - src_left) * t
-            anim.top = src_top + (dst_top - src_top) * t
-            page.update()
-            await asyncio.sleep(0.01)
+    # every slice flight is drawn by one long-lived thread, so handlers return immediately
+    animations = AnimationScheduler()
+    animation_wakeup = threading.Event()
 
-        overlay.controls.remove(anim)
+    def create_flight_sprite(slice_type):
+        cell_size = get_cell_size()
+        sprite = ft.Container(
+            content=draw_plate_flet(Plate(np.array([slice_type])), size=cell_size),
+            width=cell_size,
+            height=cell_size,
+            visible=False
+        )
+        overlay.controls.append(sprite)
+        return sprite
+
+    flight_sprites = SpritePool(create_flight_sprite)
+
+    # the overlay and the sprite pool are shared with on_resize
+    @with_ui_lock
+    def draw_animation_frame():
+        active, finished = animations.frame()
+        for flight in finished:
+            if flight.sprite is not None:
+                flight.sprite.visible = False
+                if not flight_sprites.release(flight.slice_type, flight.sprite):
+                    # drawn for the size before a resize
+                    overlay.controls.remove(flight.sprite)
+        for flight, t in active:
+            if flight.sprite is None:
+                flight.sprite = flight_sprites.acquire(flight.slice_type)
+                flight.sprite.visible = True
+            flight.sprite.left, flight.sprite.top, flight.sprite.scale = flight.position(t)
         page.update()
 
-    async def do_animations(moves):
-        for move in moves:
-            count = move.get("count", 1)
-            for _ in range(count):
-                if move["source_row"] == -1:  
-                    src_widget = plate_cells[selected_plate_index[0]]
-                else:
-                    src_widget = board_cells[move["source_row"]][move["source_column"]]
-                dst_widget = board_cells[move["destination_row"]][move["destination_column"]]
-                await animate_slice_move(src_widget, dst_widget, move["slice_type"])
+    def animation_loop():
+        while True:
+            animation_wakeup.wait()
+            draw_animation_frame()
+            if animations.active:
+                time.sleep(ANIMATION_FRAME)
+            else:
+                animation_wakeup.clear()
+                # a flight launched between the check and the clear must not be left waiting
+                if animations.active:
+                    animation_wakeup.set()
+
+    def on_keyboard(e: ft.KeyboardEvent):
+        if e.key == "Escape":
+            animations.skip()
 
     def place_plate(row, col):
         
@@ -244,19 +286,19 @@ def main(page: ft.Page):
         if game.board.get_plate_number(row, col) != 0:
             return
 
-        moves = game.place_plate(selected_plate_index[0], row, col)
-        if moves:
-            asyncio.run(do_animations(moves))
+        plate_index = selected_plate_index[0]
+        moves = game.place_plate(plate_index, row, col)
+        if animations.launch_moves(moves, get_flight_position):
+            animation_wakeup.set()
         game.cleanup_empty_plates()
         if not game.current_plates:
-            for _ in range(3):
-                game.current_plates.append(Plate.generate_plate())
+            game.reset_plates()
             selected_plate_index[0] = 0
         else:
             selected_plate_index[0] = min(selected_plate_index[0], len(game.current_plates) - 1)
         update_board()
         update_plates()
-        autosave_game()
+        autosave_game((plate_index, row, col))
         if is_board_full() and len(game.current_plates) > 0:
             show_game_over()
 
@@ -274,6 +316,8 @@ def main(page: ft.Page):
         page.clean()
         game.__init__()  
         selected_plate_index[0] = 0
+        history.clear()
+        autosave_game()
         update_board()
         update_plates()
         page.add(
@@ -289,19 +333,22 @@ def main(page: ft.Page):
         )
 
     def save_game(e):
-        with open("cakesort_save.pkl", "wb") as f:
-            pickle.dump(game, f)
+        save_writer.save_snapshot(game, "cakesort_save.cks")
 
     file_picker = ft.FilePicker()
     page.overlay.append(file_picker)
 
     def load_game_from_path(path):
         try:
-            with open(path, "rb") as f:
-                loaded_game = pickle.load(f)
-                game.__dict__.update(loaded_game.__dict__)
-                update_board()
-                update_plates()
+            # the autosave journal may still have writes queued
+            save_writer.flush()
+            loaded_game = load_journal(path) if path.endswith(".journal") else load_snapshot(path)
+            apply(game, capture(loaded_game))
+            selected_plate_index[0] = 0
+            history.clear()
+            autosave_game()
+            update_board()
+            update_plates()
         except Exception as ex:
             print("Eroare la load:", ex)
 
@@ -314,28 +361,20 @@ def main(page: ft.Page):
     def load_game(e):
         file_picker.pick_files(
             dialog_title="Alege fișierul de autosave",
-            allowed_extensions=["pkl"],
+            allowed_extensions=["cks", "journal"],
             initial_directory=temp_dir
         )
 
-    def get_last_autosave_file():
-        files = [f for f in os.listdir(temp_dir) if f.startswith("autosave_") and f.endswith(".pkl")]
-        if not files:
-            return None
-        files.sort(key=lambda x: int(x.split("_")[1].split(".")[0]))
-        return os.path.join(temp_dir, files[-2]) if len(files) > 1 else os.path.join(temp_dir, files[-1])
-
     def undo_game(e):
-        last_file = get_last_autosave_file()
-        if last_file and os.path.exists(last_file):
-            try:
-                with open(last_file, "rb") as f:
-                    loaded_game = pickle.load(f)
-                    game.__dict__.update(loaded_game.__dict__)
-                    update_board()
-                    update_plates()
-            except Exception as ex:
-                print("Eroare la undo:", ex)
+        if not history:
+            return
+        if len(history) > 1:
+            history.pop()
+        apply(game, history[-1])
+        selected_plate_index[0] = 0
+        journal.checkpoint(game)
+        update_board()
+        update_plates()
     
     save_button = ft.ElevatedButton("Save", on_click=save_game)
     load_button = ft.ElevatedButton("Load", on_click=load_game)
@@ -346,7 +385,7 @@ def main(page: ft.Page):
     update_plates()
 
     while len(game.current_plates) < 3:
-        game.current_plates.append(Plate.generate_plate())
+        game.current_plates.append(Plate.generate_plate(game.rng))
 
     overlay = ft.Stack([
         ft.Row([
@@ -362,8 +401,31 @@ def main(page: ft.Page):
         ], alignment=ft.MainAxisAlignment.CENTER, vertical_alignment=ft.CrossAxisAlignment.CENTER)
     ])
     page.add(overlay)
+    threading.Thread(target=animation_loop, name="animations", daemon=True).start()
+    page.on_keyboard_event = on_keyboard
+    STARTUP.add("first frame", time.perf_counter() - main_start)
+    print_startup_report("First frame")
+
+    # runs on the loader thread; the lock keeps handlers from drawing halfway through the swap
+    @with_ui_lock
+    def on_textures_ready(textures):
+        SPRITES.set_textures(textures)
+        invalidate_board()
+        update_board()
+        update_plates()
+        print_startup_report("Textures loaded")
+    BackgroundTask("load textures", load_textures, on_ready=on_textures_ready)
+
+    sprite_sizes = [get_cell_size(), get_plate_size()]
 
+    @with_ui_lock
     def on_resize(e):
+        sizes = [get_cell_size(), get_plate_size()]
+        for size in set(sprite_sizes) - set(sizes):
+            SPRITES.invalidate(size)
+        sprite_sizes[:] = sizes
+        for sprite in flight_sprites.clear():
+            overlay.controls.remove(sprite)
         update_board()
         update_plates()
     page.on_resize = on_resize
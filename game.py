@@ -1,28 +1,128 @@
+import copy
 from itertools import product
 from collections import defaultdict
+from typing import NamedTuple
 
 import numpy as np
 
 from utils import *
 from constants import *
-from plate import Plate
-from board import Board
+from plate import Plate, generate_plates
+from board import Board, NEIGHBOR_CELLS
+from encoding import ZOBRIST_HAND, code_hash, pack_codes, unpack_codes
+from tracing import TraceBuffer
+from transition_cache import TransitionCache
+
+class GameState(NamedTuple):
+    cell_codes: tuple[int, ...]
+    plate_numbers: tuple[int, ...]
+    hand: tuple[int, ...]
+    score: int
+    plate_counter: int
+    interacted_slices: int
+    dirty_cells: frozenset
+    key: int
+    zobrist: int
 
 class CakeSortGame:
-    def __init__(self):
+    # shared by every game: merge outcomes keyed on the placed plate and its neighbours
+    transition_cache = TransitionCache()
+
+    def __init__(self, seed=None):
         self.board = Board()
-        self.current_plates = [Plate.generate_plate() for _ in range(3)]
+        self.rng = np.random.default_rng(seed)
+        self.reset_plates()
         self.score = 0
         self.plate_counter = 1
         self.placed_plates = {}
         self.interacted_slices = 0
+        # cells whose plates changed since the last cleanup
+        self.dirty_cells = set()
+        # TraceBuffer of merge events, None when tracing is off
+        self.tracer = None
+
+    def enable_tracing(self, capacity: int = 4096) -> TraceBuffer:
+        self.tracer = TraceBuffer(capacity)
+        return self.tracer
+
+    def disable_tracing(self):
+        self.tracer = None
+
+    def snapshot(self) -> GameState:
+        return GameState(
+            tuple(self.board.cell_codes),
+            tuple(self.board.plate_number_map.ravel().tolist()),
+            tuple(plate.code for plate in self.current_plates),
+            self.score,
+            self.plate_counter,
+            self.interacted_slices,
+            frozenset(self.dirty_cells),
+            self.board.key,
+            self.board.zobrist
+        )
+
+    def restore(self, state: GameState):
+        self.board.restore(state.cell_codes, state.plate_numbers, state.key, state.zobrist)
+        self.current_plates = [Plate.from_code(code) for code in state.hand]
+        self.placed_plates = {
+            plate_number: self.board.grid[index // COLS][index % COLS]
+                for index, plate_number in enumerate(state.plate_numbers)
+                    if plate_number
+        }
+        self.score = state.score
+        self.plate_counter = state.plate_counter
+        self.interacted_slices = state.interacted_slices
+        self.dirty_cells = set(state.dirty_cells)
+
+    def clone(self):
+        game = CakeSortGame.__new__(CakeSortGame)
+        game.board = Board()
+        game.rng = copy.deepcopy(self.rng)
+        game.tracer = None
+        game.restore(self.snapshot())
+        return game
 
     def reset_plates(self):
-        self.current_plates = [Plate.generate_plate() for _ in range(3)]
+        self.current_plates = [Plate.from_catalog(plate_id) for plate_id in generate_plates(PLATES_PER_HAND, self.rng)]
+
+    def position_key(self) -> int:
+        # board cells in the low BOARD_KEY_BITS, the hand above them; score and counters are not part of it
+        return self.board.key | pack_codes(plate.code for plate in self.current_plates) << BOARD_KEY_BITS
+
+    def position_hash(self) -> int:
+        value = self.board.zobrist
+        for index, plate in enumerate(self.current_plates):
+            value ^= code_hash(ZOBRIST_HAND[index], plate.code)
+        return value
+
+    @classmethod
+    def from_position_key(cls, key: int):
+        game = cls()
+        game.board = Board.from_key(key & ((1 << BOARD_KEY_BITS) - 1))
+        game.current_plates = [
+            Plate.from_code(code)
+                for code in unpack_codes(key >> BOARD_KEY_BITS, PLATES_PER_HAND)
+                    if code
+        ]
+        game.placed_plates = {
+            plate_number: game.board.get_plate(row, column)
+                for (row, column), plate_number in np.ndenumerate(game.board.plate_number_map)
+                    if plate_number
+        }
+        game.plate_counter = len(game.placed_plates) + 1
+        game.mark_all_dirty()
+        return game
+
+    def mark_all_dirty(self):
+        self.dirty_cells = set(product(range(ROWS),range(COLS)))
 
     def cleanup_empty_plates(self):
         cleared_positions = []
-        for row,column in product(range(ROWS),range(COLS)):
+        if not self.dirty_cells:
+            return cleared_positions
+        tracer = self.tracer
+        score = self.score
+        for row,column in sorted(self.dirty_cells):
             plate_number = self.board.get_plate_number(row,column)
             if plate_number != 0:
                 plate = self.placed_plates[plate_number]
@@ -30,12 +130,18 @@ class CakeSortGame:
                     self.board.remove_plate(row,column)
                     del self.placed_plates[plate_number]
                     cleared_positions.append((row,column))
-                    print(f"Plate at ({row+1},{column+1}) is empty and removed from board.")
+                    if tracer is not None:
+                        tracer.record("clear",row=row,column=column,plate_number=int(plate_number),reason="empty")
                 if plate.is_clearable:
+                    if tracer is not None:
+                        tracer.record("clear",row=row,column=column,plate_number=int(plate_number),reason="complete")
                     plate.slices = np.array([],dtype=int)
                     self.board.remove_plate(row,column)
                     del self.placed_plates[plate_number]
                     self.score+=1
+        if tracer is not None and self.score != score:
+            tracer.record("score",delta=self.score-score,score=self.score)
+        self.dirty_cells.clear()
         return cleared_positions
 
     def place_plate(self,plate_index,row_index,column_index):
@@ -48,12 +154,66 @@ class CakeSortGame:
             return []
 
         self.placed_plates[self.plate_counter] = selected_plate
-        moves = self.__process_new_plate(row_index,column_index)
+        self.dirty_cells.add((row_index,column_index))
+        if self.tracer is not None:
+            self.tracer.record(
+                "place",plate_index=plate_index,row=row_index,column=column_index,plate=repr(selected_plate)
+            )
+        moves = self.__resolve_new_plate(row_index,column_index)
         self.plate_counter+=1
         return moves
 
+    def __resolve_new_plate(self, row, column):
+        cache = self.transition_cache
+        if cache is None or self.tracer is not None:
+            return self.__process_new_plate(row, column)
+
+        cells = (row * COLS + column,) + NEIGHBOR_CELLS[row * COLS + column]
+        cell_codes = self.board.cell_codes
+        key = tuple(cell_codes[cell] for cell in cells)
+        entry = cache.get(key)
+
+        if entry is None:
+            interacted_slices = self.interacted_slices
+            moves = self.__process_new_plate(row, column)
+            slots = {divmod(cell, COLS): slot for slot, cell in enumerate(cells)}
+            cache.put(key, (
+                tuple(cell_codes[cell] for cell in cells),
+                tuple(
+                    (
+                        slots[move["source_row"], move["source_column"]],
+                        slots[move["destination_row"], move["destination_column"]],
+                        int(move["slice_type"]),
+                        move["count"]
+                    )
+                        for move in moves
+                ),
+                self.interacted_slices - interacted_slices
+            ))
+            return moves
+
+        # replay the cached outcome onto this neighbourhood
+        result_codes, slot_moves, interacted_slices = entry
+        for cell, old_code, new_code in zip(cells, key, result_codes):
+            if old_code != new_code:
+                cell_row, cell_column = divmod(cell, COLS)
+                self.board.get_plate(cell_row, cell_column).set_code(new_code)
+                self.board.refresh_cell(cell_row, cell_column)
+        moves = []
+        for source, destination, slice_type, count in slot_moves:
+            source_row, source_column = divmod(cells[source], COLS)
+            destination_row, destination_column = divmod(cells[destination], COLS)
+            self.dirty_cells.add((source_row, source_column))
+            self.dirty_cells.add((destination_row, destination_column))
+            moves.append(create_move(
+                source_row, source_column, destination_row, destination_column, slice_type, count
+            ))
+        self.interacted_slices += interacted_slices
+        return moves
+
     def __process_new_plate(self, row, column):
         plate = self.board.get_plate(row, column)
+        tracer = self.tracer
         moves = []
         neighbors = [
             (
@@ -73,28 +233,30 @@ class CakeSortGame:
         for neighbor,intersection,neighbor_row,neighbor_column in neighbors:
             for intersect in intersection:
                 grouped[intersect].append((neighbor,neighbor_row,neighbor_column))
-        # print(grouped)
 
         for slice_type,group in grouped.items():
-            print(f"{slice_type=}")
             if len(group) > 1:
                 if plate.slices_types == 1:
                     # plate has a single type and all neighbors shares the same type with the plate
-                    print("Case 0x111")
+                    if tracer is not None:
+                        tracer.record("case",case="0x111",slice_type=int(slice_type),group=len(group))
                     for neighbor,neighbor_row,neighbor_column in group:
                         self.__interchange_plates(
                             plate,neighbor,row,column,neighbor_row,neighbor_column,
                             slice_type,moves
                         )
                 else:
-                    print("Case 0x222")
                     # otherwise the plate with more slices will be selected to have all slices
                     ordered_group = sorted(
                         group,
                         key=lambda x: x[0].count_slice(slice_type) if x[0].empty_spaces else 0
                     )
                     selected_plate,selected_row,selected_column = ordered_group.pop()
-                    print(f"{selected_row=}\n{selected_column=}")
+                    if tracer is not None:
+                        tracer.record(
+                            "case",case="0x222",slice_type=int(slice_type),group=len(group),
+                            selected_row=selected_row,selected_column=selected_column
+                        )
 
                     for neighbor,neighbor_row,neighbor_column in ordered_group:
                         self.__interchange_plates(
@@ -110,7 +272,8 @@ class CakeSortGame:
                     # in the case, remaining slices are not moved
                     for neighbor,neighbor_row,neighbor_column in ordered_group:
                         if neighbor.count_slice(slice_type) not in [0,6] and plate.count_slice(slice_type):
-                            print("Subcase")
+                            if tracer is not None:
+                                tracer.record("case",case="0x222/subcase",slice_type=int(slice_type))
                             if selected_plate.is_clearable:
                                 selected_plate,selected_row,selected_column = ordered_group.pop()
                             self.__interchange_plates(
@@ -127,7 +290,8 @@ class CakeSortGame:
             neighbor,neighbor_row,neighbor_column = group.pop()
             
             if neighbor.slices_types == 1 and plate.slices_types != 1:
-                print("Case 0x21")
+                if tracer is not None:
+                    tracer.record("case",case="0x21",slice_type=int(slice_type))
                 # when plate has more types and neighbor just one, go to neighbor
                 self.__interchange_plates(
                     neighbor,plate,neighbor_row,neighbor_column,row,column,
@@ -138,7 +302,8 @@ class CakeSortGame:
                 and plate ^ neighbor\
                 and all(inter > slice_type and len(group) == 0 for inter,group in grouped.items()):
                 # when plate and neighbor shares exactly same 2 types, interchange the slices
-                print("Case 0x22")
+                if tracer is not None:
+                    tracer.record("case",case="0x22",slice_type=int(slice_type))
 
                 self.__interchange_plates(
                     plate,neighbor,row,column,neighbor_row,neighbor_column,
@@ -151,7 +316,8 @@ class CakeSortGame:
                 )
             else:
                 # when plate shares a type with a neighbor, go to plate
-                print("Case 0x11")
+                if tracer is not None:
+                    tracer.record("case",case="0x11",slice_type=int(slice_type))
                 self.__interchange_plates(
                     plate,neighbor,row,column,neighbor_row,neighbor_column,
                     slice_type,moves
@@ -176,7 +342,13 @@ class CakeSortGame:
 
         plate2.remove_slices(slice_type,count)
         plate1.add_slices(slice_type,count)
+        self.board.refresh_cell(plate1_row,plate1_column)
+        self.board.refresh_cell(plate2_row,plate2_column)
+        self.dirty_cells.add((plate1_row,plate1_column))
+        self.dirty_cells.add((plate2_row,plate2_column))
         moves.append(create_move(
-            plate2_row,plate2_column,plate1_row,plate1_column,slice_type,count
+            plate2_row,plate2_column,plate1_row,plate1_column,int(slice_type),count
         ))
+        if self.tracer is not None:
+            self.tracer.record("move",**moves[-1])
         self.interacted_slices+=count
@@ -2,7 +2,9 @@ import tkinter as tk
 from tkinter import messagebox
 from game import CakeSortGame
 from constants import ROWS, COLS, CAKE_TYPE_COLORS, MAX_SLICES_PER_PLATE
-import time
+from animation import AnimationScheduler, SpritePool
+
+ANIMATION_FRAME_MS = 16
 
 def draw_plate_canvas(parent, plate, size=60):
     canvas = tk.Canvas(parent, width=size, height=size, bg="white", highlightthickness=0)
@@ -28,6 +30,13 @@ class CakeSortGUI:
         self.selected_plate_index = None
 
         self.board_buttons = [[None for _ in range(COLS)] for _ in range(ROWS)]
+        self.animations = AnimationScheduler()
+        self.flight_windows = SpritePool(self.create_flight_window)
+        self.animation_running = False
+        self.root.bind("<Escape>", self.skip_animations)
+        self.slice_arcs = [[None for _ in range(COLS)] for _ in range(ROWS)]
+        # packed plate code each cell was last drawn with
+        self.cell_signatures = [[0 for _ in range(COLS)] for _ in range(ROWS)]
         self.plate_buttons = []
 
         self.score_label = tk.Label(root, text="Score: 0")
@@ -56,6 +65,17 @@ class CakeSortGUI:
                 canvas.pack()
                 canvas.bind("<Button-1>", lambda e, r=r, c=c: self.place_plate(r, c))
                 self.board_buttons[r][c] = canvas
+                angle_per_slice = 360 / MAX_SLICES_PER_PLATE
+                self.slice_arcs[r][c] = [
+                    canvas.create_arc(
+                        2, 2, 58, 58,
+                        start=index * angle_per_slice,
+                        extent=angle_per_slice,
+                        outline="black",
+                        state=tk.HIDDEN
+                    )
+                        for index in range(MAX_SLICES_PER_PLATE)
+                ]
 
     def draw_plates(self):
         for widget in self.plates_frame.winfo_children():
@@ -86,33 +106,30 @@ class CakeSortGUI:
             return
 
         selected_plate = self.game.current_plates[self.selected_plate_index]
-        result = self.game.place_plate(self.selected_plate_index, row, col)
-        if isinstance(result, tuple):
-            success, moves = result
-        else:
-            success, moves = result, []
-        if not success:
-            messagebox.showerror("Error", "Invalid move!")
-            return
+        # the cell is free, so the placement always succeeds; moves lists the slices that merged
+        moves = self.game.place_plate(self.selected_plate_index, row, col)
 
         # Pentru Costin:
         # Această secțiune animă vizual "zborul" primei felii de pe farfuria selectată (din zona de jos)
         # către poziția de pe tablă unde este plasată farfuria nouă.
         # Dacă farfuria selectată nu mai are felii (ex: după clear), animația nu se mai face.
+        # Zborurile rulează în paralel prin root.after, deci jocul rămâne interactiv (Escape le sare).
+        delay = 0.0
         if selected_plate.slices.size > 0:
-            self.animate_slice_move(-1, -1, row, col, selected_plate.slices[0], speedup=3)
+            self.animations.launch(
+                self.canvas_center(self.plate_canvases[self.selected_plate_index][0]),
+                self.canvas_center(self.board_buttons[row][col]),
+                selected_plate.slices[0]
+            )
+            delay = self.animations.duration / 2
 
         # Animatie pentru fiecare felie mutată între plates
-        for move in moves:
-            for _ in range(move["count"]):
-                self.animate_slice_move(
-                    move["source_row"],
-                    move["source_column"],
-                    move["destination_row"],
-                    move["destination_column"], 
-                    move["slice_type"],
-                    speedup=3
-                )
+        self.animations.launch_moves(
+            moves,
+            lambda r, c: self.canvas_center(self.board_buttons[r][c]),
+            delay
+        )
+        self.start_animations()
 
         self.selected_plate_index = None
         self.update_gui()
@@ -125,66 +142,74 @@ class CakeSortGUI:
         self.score_label.config(text=f"Score: {self.game.score}")
         for r in range(ROWS):
             for c in range(COLS):
-                canvas = self.board_buttons[r][c]
-                canvas.delete("all")
-                plate_number = self.game.board.get_plate_number(r, c)
-                if plate_number != 0:
-                    plate = self.game.placed_plates.get(plate_number)
-                    if plate:
-                        angle_per_slice = 360 / MAX_SLICES_PER_PLATE
-                        start_angle = 0
-                        for slice_type in plate.slices:
-                            color = CAKE_TYPE_COLORS.get(slice_type, "gray")
-                            canvas.create_arc(
-                                2, 2, 58, 58,
-                                start=start_angle,
-                                extent=angle_per_slice,
-                                fill=color,
-                                outline="black"
-                            )
-                            start_angle += angle_per_slice
+                self.update_cell(r, c)
         for r, c in cleared_positions:
             self.flash_red_tile(r, c)
         self.draw_plates()
 
-    def animate_slice_move(self, src_row, src_col, dst_row, dst_col, slice_type, speedup=1):
-        src_canvas = self.board_buttons[src_row][src_col] if src_row >= 0 and src_col >= 0 else self.plate_canvases[self.selected_plate_index][0]
-        dst_canvas = self.board_buttons[dst_row][dst_col]
-        color = CAKE_TYPE_COLORS.get(slice_type, "gray")
-        src_x = src_canvas.winfo_rootx() - self.root.winfo_rootx() + 30
-        src_y = src_canvas.winfo_rooty() - self.root.winfo_rooty() + 30
-        dst_x = dst_canvas.winfo_rootx() - self.root.winfo_rootx() + 30
-        dst_y = dst_canvas.winfo_rooty() - self.root.winfo_rooty() + 30
+    def update_cell(self, row, col):
+        # the six arcs of a cell are reused; only cells whose plate contents changed are touched
+        plate_number = self.game.board.get_plate_number(row, col)
+        plate = self.game.placed_plates.get(plate_number) if plate_number != 0 else None
+        signature = plate.code if plate else 0
+        if signature == self.cell_signatures[row][col]:
+            return
+        self.cell_signatures[row][col] = signature
+        canvas = self.board_buttons[row][col]
+        slices = plate.slices if plate else ()
+        for index, arc in enumerate(self.slice_arcs[row][col]):
+            if index < len(slices):
+                canvas.itemconfig(arc, fill=CAKE_TYPE_COLORS.get(slices[index], "gray"), state=tk.NORMAL)
+            else:
+                canvas.itemconfig(arc, state=tk.HIDDEN)
+
+    def canvas_center(self, canvas):
+        return (
+            canvas.winfo_rootx() - self.root.winfo_rootx() + 30,
+            canvas.winfo_rooty() - self.root.winfo_rooty() + 30
+        )
 
+    def create_flight_window(self, slice_type):
         float_win = tk.Toplevel(self.root)
         float_win.overrideredirect(True)
         float_win.attributes('-topmost', True)
-        float_win.geometry(f"60x60+{int(src_x-30+self.root.winfo_rootx())}+{int(src_y-30+self.root.winfo_rooty())}")
+        float_win.withdraw()
         float_canvas = tk.Canvas(float_win, width=60, height=60, highlightthickness=0, bg='white')
         float_canvas.pack()
+        color = CAKE_TYPE_COLORS.get(slice_type, "gray")
         arc = float_canvas.create_arc(5, 5, 55, 55, start=0, extent=60, fill=color, outline="black")
-
-        steps = int(40 // speedup)
-        for i in range(steps):
-            t = i / (steps - 1)
-            bounce = 2.5 * (1 - (2 * t - 1) ** 2)
-            scale = 1 + 0.2 * (1 - abs(2 * t - 1))
-            nx = src_x + (dst_x - src_x) * t
-            ny = src_y + (dst_y - src_y) * t - 40 * bounce
+        return float_win, float_canvas, arc
+
+    def start_animations(self):
+        if not self.animation_running and self.animations.active:
+            self.animation_running = True
+            self.root.after(0, self.animation_frame)
+
+    def skip_animations(self, event=None):
+        self.animations.skip()
+
+    def animation_frame(self):
+        active, finished = self.animations.frame()
+        for flight in finished:
+            if flight.sprite is not None:
+                flight.sprite[0].withdraw()
+                self.flight_windows.release(flight.slice_type, flight.sprite)
+        for flight, t in active:
+            if flight.sprite is None:
+                flight.sprite = self.flight_windows.acquire(flight.slice_type)
+                flight.sprite[0].deiconify()
+            float_win, float_canvas, arc = flight.sprite
+            nx, ny, scale = flight.position(t)
             size = int(60 * scale)
-            offset = (60 - size) // 2
             float_win.geometry(f"{size}x{size}+{int(nx-size//2+self.root.winfo_rootx())}+{int(ny-size//2+self.root.winfo_rooty())}")
             float_canvas.config(width=size, height=size)
             float_canvas.coords(arc, 5, 5, size-5, size-5)
-            self.root.update_idletasks()
-            self.root.update()
-            time.sleep(0.018 / speedup)
-        for alpha in range(10, 0, -1):
-            float_win.attributes("-alpha", alpha / 10)
-            self.root.update_idletasks()
-            self.root.update()
-            time.sleep(0.02 / speedup)
-        float_win.destroy()
+            # fade out over the last fifth of the flight
+            float_win.attributes("-alpha", min(1.0, 5 * (1 - t)))
+        if self.animations.active:
+            self.root.after(ANIMATION_FRAME_MS, self.animation_frame)
+        else:
+            self.animation_running = False
 
     def flash_red_tile(self, row, col, duration=200):
         canvas = self.board_buttons[row][col]
@@ -0,0 +1,164 @@
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from constants import *
+from plate import Plate, MASK_TYPE_COUNT, generate_plates
+
+GAME_OVER_VALUE = -10.0
+INTERACTION_WEIGHT = 0.1
+EMPTY_CELL_WEIGHT = 0.05
+MIXED_PLATE_WEIGHT = 0.02
+
+class Hint(NamedTuple):
+    plate_index: int
+    row: int
+    column: int
+    value: float
+    depth: int
+    nodes: int
+
+class SearchTimeout(Exception):
+    pass
+
+class HintEngine:
+    def __init__(
+        self,
+        time_budget: float = 0.05,
+        node_budget: int | None = None,
+        max_depth: int = 6,
+        chance_samples: int = 4,
+        table_size: int = 1 << 18,
+        seed=None
+    ):
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.max_depth = max_depth
+        self.chance_samples = chance_samples
+        self.table_size = table_size
+        self.rng = np.random.default_rng(seed)
+        # (position key, depth) -> expected future reward
+        self.transpositions = {}
+
+    def best_move(self, game) -> Hint | None:
+        root_moves = self.__legal_moves(game)
+        if not root_moves:
+            return None
+
+        self.nodes = 0
+        self.deadline = time.perf_counter() + self.time_budget
+        state = game.snapshot()
+        tracer, game.tracer = game.tracer, None
+        best = Hint(*root_moves[0], GAME_OVER_VALUE, 0, 0)
+        try:
+            for depth in range(1, self.max_depth + 1):
+                # search the previous best first so a cut-off iteration still refines it
+                ordered = sorted(root_moves, key=lambda move: move != best[:3])
+                partial = None
+                try:
+                    for move in ordered:
+                        value = self.__child_value(game, state, move, depth)
+                        if partial is None or value > partial[1]:
+                            partial = (move, value)
+                except SearchTimeout:
+                    if depth == 1 and partial is not None:
+                        best = Hint(*partial[0], partial[1], depth, self.nodes)
+                    break
+                best = Hint(*partial[0], partial[1], depth, self.nodes)
+        finally:
+            game.restore(state)
+            game.tracer = tracer
+        return best._replace(nodes=self.nodes)
+
+    def __tick(self):
+        self.nodes += 1
+        if self.node_budget is not None and self.nodes > self.node_budget:
+            raise SearchTimeout
+        if not self.nodes & 15 and time.perf_counter() > self.deadline:
+            raise SearchTimeout
+
+    def __legal_moves(self, game) -> list[tuple[int, int, int]]:
+        empty_cells = list(zip(*np.nonzero(game.board.plate_number_map == 0)))
+        moves = []
+        seen_plates = set()
+        for plate_index, plate in enumerate(game.current_plates):
+            # identical plates in the hand lead to identical positions
+            if plate.code in seen_plates:
+                continue
+            seen_plates.add(plate.code)
+            moves.extend((plate_index, int(row), int(column)) for row, column in empty_cells)
+        return moves
+
+    def __child_value(self, game, state, move, depth) -> float:
+        self.__tick()
+        score, interacted_slices = game.score, game.interacted_slices
+        game.place_plate(*move)
+        game.cleanup_empty_plates()
+        reward = game.score - score + INTERACTION_WEIGHT * (game.interacted_slices - interacted_slices)
+        if game.current_plates:
+            value = reward + self.__max_value(game, depth - 1)
+        else:
+            value = reward + self.__chance_value(game, depth - 1)
+        game.restore(state)
+        return value
+
+    def __max_value(self, game, depth) -> float:
+        if depth == 0:
+            return self.evaluate(game)
+        moves = self.__legal_moves(game)
+        if not moves:
+            return GAME_OVER_VALUE
+
+        key = (game.position_key(), depth)
+        value = self.transpositions.get(key)
+        if value is not None:
+            return value
+
+        state = game.snapshot()
+        value = max(self.__child_value(game, state, move, depth) for move in moves)
+        self.__store(key, value)
+        return value
+
+    def __chance_value(self, game, depth) -> float:
+        # sampled chance node over the refill of the whole hand
+        if depth == 0:
+            return self.evaluate(game)
+
+        key = (game.position_key(), depth)
+        value = self.transpositions.get(key)
+        if value is not None:
+            return value
+
+        plate_ids = generate_plates(self.chance_samples * PLATES_PER_HAND, self.rng)
+        state = game.snapshot()
+        total = 0.0
+        for sample in range(self.chance_samples):
+            game.current_plates = [
+                Plate.from_catalog(plate_id)
+                    for plate_id in plate_ids[sample * PLATES_PER_HAND:(sample + 1) * PLATES_PER_HAND]
+            ]
+            total += self.__max_value(game, depth)
+            game.restore(state)
+        value = total / self.chance_samples
+        self.__store(key, value)
+        return value
+
+    def __store(self, key, value):
+        if len(self.transpositions) >= self.table_size:
+            self.transpositions.clear()
+        self.transpositions[key] = value
+
+    @staticmethod
+    def evaluate(game) -> float:
+        empty_cells = 0
+        mixed_types = 0
+        for plates, plate_numbers in zip(game.board.grid, game.board.plate_number_map):
+            for plate, plate_number in zip(plates, plate_numbers):
+                if not plate_number:
+                    empty_cells += 1
+                else:
+                    mixed_types += max(MASK_TYPE_COUNT[plate.mask] - 1, 0)
+        if not empty_cells:
+            return GAME_OVER_VALUE
+        return EMPTY_CELL_WEIGHT * empty_cells - MIXED_PLATE_WEIGHT * mixed_types
@@ -0,0 +1,61 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from constants import *
+from env import SLOT_SHIFTS
+from transition_cache import TransitionCache
+
+class Placement(NamedTuple):
+    plate_index: int
+    row: int
+    column: int
+    q_value: float
+
+def encode_states(cell_codes, plate_codes) -> np.ndarray:
+    # one Env.get_state vector per plate, all sharing the same board
+    states = np.empty((len(plate_codes), STATE_SIZE), dtype=np.float32)
+    states[:, :BOARD_STATE_SIZE] = ((np.array(cell_codes)[:, np.newaxis] >> SLOT_SHIFTS) & SLICE_MASK).ravel()
+    states[:, BOARD_STATE_SIZE:] = (np.array(plate_codes)[:, np.newaxis] >> SLOT_SHIFTS[:-1]) & SLICE_MASK
+    return states
+
+class HintService:
+    # model maps a (plates, STATE_SIZE) float32 batch to (plates, ROWS * COLS) Q-values
+    def __init__(self, model, capacity: int = 4096):
+        self.model = model
+        self.cache = TransitionCache(capacity)
+
+    def hints(self, game) -> tuple[Placement, ...]:
+        # every legal placement of every plate in the hand, best first
+        plate_codes = tuple(plate.code for plate in game.current_plates)
+        key = (game.board.key, plate_codes)
+        placements = self.cache.get(key)
+        if placements is not None:
+            return placements
+
+        unique_codes = list(dict.fromkeys(plate_codes))
+        if unique_codes:
+            q_values = np.asarray(self.model(encode_states(game.board.cell_codes, unique_codes)))
+        legal_cells = np.flatnonzero(game.board.plate_number_map.reshape(-1) == 0)
+        placements = []
+        for plate_index, code in enumerate(plate_codes):
+            plate_q_values = q_values[unique_codes.index(code)]
+            placements.extend(
+                Placement(plate_index, *divmod(int(cell), COLS), float(plate_q_values[cell]))
+                    for cell in legal_cells
+            )
+        placements = tuple(sorted(placements, key=lambda placement: -placement.q_value))
+        self.cache.put(key, placements)
+        return placements
+
+    def best(self, game, plate_index: int | None = None) -> Placement | None:
+        for placement in self.hints(game):
+            if plate_index is None or placement.plate_index == plate_index:
+                return placement
+        return None
+
+def keras_predictor(model):
+    # direct call instead of model.predict, which has a large fixed cost per call for small batches
+    def predict(states):
+        return model(states, training=False).numpy()
+    return predict
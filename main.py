@@ -1,18 +1,25 @@
-from game import CakeSortGame
-from consoleview import ConsoleView
+from startup import STARTUP, print_startup_report
 
 from sys import argv
 
 def main():
     if len(argv) < 2:
-        import tkinter as tk
-        from gui import CakeSortGUI
-        root = tk.Tk()
-        app = CakeSortGUI(root)
+        with STARTUP.phase("import tkinter"):
+            import tkinter as tk
+        with STARTUP.phase("import gui"):
+            from gui import CakeSortGUI
+        with STARTUP.phase("build window"):
+            root = tk.Tk()
+            app = CakeSortGUI(root)
+        root.after_idle(print_startup_report, "First frame")
         root.mainloop()
     else:
+        with STARTUP.phase("import engine"):
+            from game import CakeSortGame
+            from consoleview import ConsoleView
         game = CakeSortGame()
         view = ConsoleView(game)
+        print_startup_report("Console ready")
         view.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,109 @@
+import csv
+import heapq
+import json
+import math
+import time
+from contextlib import contextmanager
+
+class RunningStats:
+    # count/mean/variance (Welford), extremes and an exact median from two heaps, all O(log n) per value
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.lower = []  # max-heap of the smaller half, negated
+        self.upper = []  # min-heap of the larger half
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+        if self.lower and value > -self.lower[0]:
+            heapq.heappush(self.upper, value)
+        else:
+            heapq.heappush(self.lower, -value)
+        if len(self.lower) > len(self.upper) + 1:
+            heapq.heappush(self.upper, -heapq.heappop(self.lower))
+        elif len(self.upper) > len(self.lower):
+            heapq.heappush(self.lower, -heapq.heappop(self.upper))
+
+    @property
+    def median(self) -> float:
+        if not self.count:
+            return math.nan
+        if len(self.lower) > len(self.upper):
+            return -self.lower[0]
+        return (self.upper[0] - self.lower[0]) / 2
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def summary(self, prefix: str) -> dict[str, float]:
+        return {
+            f"{prefix}_mean": self.mean,
+            f"{prefix}_median": self.median,
+            f"{prefix}_max": self.max,
+            f"{prefix}_std": math.sqrt(self.variance)
+        }
+
+class PhaseTimer:
+    # phases listed up front are always reported, with 0.0 when they did not run
+    def __init__(self, phases: tuple[str, ...] = ()):
+        self.phases = phases
+        self.totals = dict.fromkeys(phases, 0.0)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def add(self, name: str, seconds: float):
+        self.totals[name] = self.totals.get(name, 0.0) + seconds
+
+    def reset(self) -> dict[str, float]:
+        # returns the totals since the previous reset
+        totals, self.totals = self.totals, dict.fromkeys(self.phases, 0.0)
+        return totals
+
+def _finite(value):
+    # NaN and infinities are not valid JSON, so they are written as null
+    return None if isinstance(value, float) and not math.isfinite(value) else value
+
+class MetricsWriter:
+    # one record per line, as JSON for .jsonl paths and CSV otherwise
+    def __init__(self, path: str, fieldnames: list[str] | None = None):
+        self.path = path
+        self.format = "csv" if path.endswith(".csv") else "jsonl"
+        self.fieldnames = fieldnames
+        self.file = open(path, "a", newline="")
+        self.csv_writer = None
+
+    def write(self, record: dict):
+        if self.format == "jsonl":
+            self.file.write(json.dumps({key: _finite(value) for key, value in record.items()}, allow_nan=False) + "\n")
+        else:
+            if self.csv_writer is None:
+                self.csv_writer = csv.DictWriter(self.file, self.fieldnames or list(record), extrasaction="ignore")
+                if not self.file.tell():
+                    self.csv_writer.writeheader()
+            self.csv_writer.writerow(record)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,226 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from constants import *
+
+ACTIVATIONS = {
+    "linear": lambda x: x,
+    "relu": lambda x: np.maximum(x, 0),
+    "tanh": np.tanh,
+    "sigmoid": lambda x: 1 / (1 + np.exp(-x))
+}
+
+# Lambda layers cannot be rebuilt from their pickled code, so they are recognised by name;
+# lambda/lambda_1 are the default names the unnamed slices in train.py used to get
+LAMBDA_SLICES = {
+    "board_slice": slice(None, BOARD_STATE_SIZE),
+    "plate_slice": slice(BOARD_STATE_SIZE, None),
+    "lambda": slice(None, BOARD_STATE_SIZE),
+    "lambda_1": slice(BOARD_STATE_SIZE, None)
+}
+
+def _inbound_layers(node) -> list[str]:
+    # Keras 2 lists [layer, node, tensor, kwargs] per input; Keras 3 nests tensors with a keras_history in the call args
+    if isinstance(node, list):
+        if node and isinstance(node[0], str):
+            return [node[0]]
+        return [name for item in node for name in _inbound_layers(item)]
+    if isinstance(node, dict):
+        history = node.get("config", {}).get("keras_history") if node.get("class_name") == "__keras_tensor__" else None
+        if history is not None:
+            return [history[0]]
+        return [name for key, item in node.items() if key != "kwargs" for name in _inbound_layers(item)]
+    return []
+
+def _read_h5(path: str) -> tuple[list[dict], dict[str, np.ndarray]]:
+    import h5py
+
+    with h5py.File(path, "r") as file:
+        model_config = json.loads(file.attrs["model_config"])
+        weight_group = file["model_weights"] if "model_weights" in file else file
+        layers = []
+        weights = {}
+        sequential = model_config["class_name"] == "Sequential"
+        previous = None
+        for layer in model_config["config"]["layers"]:
+            config = layer["config"]
+            name = config["name"]
+            if sequential:
+                inputs = [previous] if previous is not None else []
+            else:
+                inputs = [name for node in layer.get("inbound_nodes", []) for name in _inbound_layers(node)]
+            layers.append({"name": name, "class": layer["class_name"], "inputs": inputs, "config": config})
+            previous = name
+
+            if name in weight_group:
+                for weight_name in weight_group[name].attrs.get("weight_names", []):
+                    weight_name = weight_name.decode() if isinstance(weight_name, bytes) else weight_name
+                    short_name = weight_name.rsplit("/", 1)[-1].split(":")[0]
+                    weights[f"{name}/{short_name}"] = np.asarray(weight_group[name][weight_name], dtype=np.float32)
+
+        if not sequential:
+            outputs = _inbound_layers(model_config["config"]["output_layers"])
+            layers.append({"name": "__output__", "class": "Output", "inputs": outputs, "config": {}})
+    return layers, weights
+
+class NumpyModel:
+    # runs a Keras model made of the layer types train.py uses, with NumPy only
+    def __init__(self, layers: list[dict], weights: dict[str, np.ndarray]):
+        self.layers = layers
+        self.weights = weights
+        for layer in layers:
+            if layer["class"] not in self.LAYERS:
+                raise ValueError(f"Unsupported layer {layer['class']} ({layer['name']})")
+            if layer["class"] == "Lambda" and layer["name"] not in LAMBDA_SLICES:
+                raise ValueError(f"Unknown Lambda layer {layer['name']!r}")
+
+    @classmethod
+    def from_h5(cls, path: str):
+        return cls(*_read_h5(path))
+
+    @classmethod
+    def load(cls, path: str):
+        if path.endswith(".h5"):
+            return cls.from_h5(path)
+        with np.load(path) as data:
+            layers = json.loads(str(data["layers"]))
+            weights = {name: data[name] for name in data.files if name != "layers"}
+        return cls(layers, weights)
+
+    def save(self, path: str):
+        np.savez(path, layers=np.array(json.dumps(self.layers)), **self.weights)
+
+    def __call__(self, states: np.ndarray) -> np.ndarray:
+        # a single state gives a single row of Q-values, a batch gives one row per state
+        states = np.asarray(states, dtype=np.float32)
+        single = states.ndim == 1
+        values = {}
+        for layer in self.layers:
+            # layers without inputs read the states, which only input layers should do
+            inputs = [values[name] for name in layer["inputs"]] or [states[np.newaxis] if single else states]
+            output = self.LAYERS[layer["class"]](self, layer, *inputs)
+            values[layer["name"]] = output
+        return output[0] if single else output
+
+    predict = __call__
+
+    def _input(self, layer, x):
+        return x
+
+    def _dense(self, layer, x):
+        config = layer["config"]
+        x = x @ self.weights[f"{layer['name']}/kernel"]
+        if config.get("use_bias", True):
+            x = x + self.weights[f"{layer['name']}/bias"]
+        return ACTIVATIONS[config.get("activation", "linear")](x)
+
+    def _conv2d(self, layer, x):
+        config = layer["config"]
+        if tuple(config.get("strides", (1, 1))) != (1, 1) or tuple(config.get("dilation_rate", (1, 1))) != (1, 1):
+            raise ValueError(f"Only unit strides and dilation are supported ({layer['name']})")
+        kernel = self.weights[f"{layer['name']}/kernel"]
+        kernel_height, kernel_width = kernel.shape[:2]
+        if config.get("padding", "valid") == "same":
+            x = np.pad(x, (
+                (0, 0),
+                ((kernel_height - 1) // 2, kernel_height // 2),
+                ((kernel_width - 1) // 2, kernel_width // 2),
+                (0, 0)
+            ))
+        # im2col: every output cell's receptive field as one row, in the kernel's (rows, columns, channels) order
+        patches = sliding_window_view(x, (kernel_height, kernel_width), axis=(1, 2)).transpose(0, 1, 2, 4, 5, 3)
+        x = patches.reshape(*patches.shape[:3], -1) @ kernel.reshape(-1, kernel.shape[-1])
+        if config.get("use_bias", True):
+            x = x + self.weights[f"{layer['name']}/bias"]
+        return ACTIVATIONS[config.get("activation", "linear")](x)
+
+    def _flatten(self, layer, x):
+        return x.reshape(len(x), -1)
+
+    def _reshape(self, layer, x):
+        return x.reshape(len(x), *layer["config"]["target_shape"])
+
+    def _concatenate(self, layer, *inputs):
+        return np.concatenate(inputs, axis=layer["config"].get("axis", -1))
+
+    def _lambda(self, layer, x):
+        return x[:, LAMBDA_SLICES[layer["name"]]]
+
+    def _activation(self, layer, x):
+        return ACTIVATIONS[layer["config"]["activation"]](x)
+
+    def _output(self, layer, *outputs):
+        return outputs[0]
+
+    LAYERS = {
+        "InputLayer": _input,
+        "Dense": _dense,
+        "Conv2D": _conv2d,
+        "Flatten": _flatten,
+        "Reshape": _reshape,
+        "Concatenate": _concatenate,
+        "Lambda": _lambda,
+        "Activation": _activation,
+        "Output": _output
+    }
+
+def load_keras_model(path: str):
+    # for trusted files only: Keras 3 refuses the Lambda slices without safe_mode=False
+    from tensorflow.keras.models import load_model
+
+    try:
+        return load_model(path, compile=False, safe_mode=False)
+    except TypeError:
+        # Keras 2 has no safe_mode
+        return load_model(path, compile=False)
+
+def check_parity(h5_path: str, npz_path: str, samples: int = 1000, seed: int = 0) -> float:
+    # largest absolute difference from Keras on random observations, with both timings
+    keras_model = load_keras_model(h5_path)
+    numpy_model = NumpyModel.load(npz_path)
+    states = np.random.default_rng(seed).integers(0, len(CAKE_SLICE_TYPES) + 1, (samples, keras_model.input_shape[1]))
+    states = states.astype(np.float32)
+
+    expected = keras_model.predict(states, verbose=0)
+    error = float(np.abs(numpy_model(states) - expected).max())
+    single_error = float(np.abs(numpy_model(states[0]) - expected[0]).max())
+
+    start = time.perf_counter()
+    for state in states[:100]:
+        numpy_model(state)
+    numpy_latency = (time.perf_counter() - start) / 100
+    start = time.perf_counter()
+    for state in states[:100]:
+        keras_model(state[np.newaxis], training=False)
+    keras_latency = (time.perf_counter() - start) / 100
+
+    print(f"max abs error: batched {error:.3g}, single {single_error:.3g}")
+    print(f"single state latency: numpy {1e6 * numpy_latency:.1f} us, keras {1e6 * keras_latency:.1f} us")
+    return max(error, single_error)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a Keras .h5 model to .npz and run it with NumPy.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="write the weights and layer graph of an .h5 model to .npz")
+    export.add_argument("h5", nargs="?", default="cake_sort_model.h5")
+    export.add_argument("npz", nargs="?", default="cake_sort_model.npz")
+    check = commands.add_parser("check", help="compare the NumPy forward pass with Keras (needs TensorFlow)")
+    check.add_argument("h5", nargs="?", default="cake_sort_model.h5")
+    check.add_argument("npz", nargs="?", default="cake_sort_model.npz")
+    check.add_argument("--samples", type=int, default=1000)
+    check.add_argument("--tolerance", type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        NumpyModel.from_h5(args.h5).save(args.npz)
+        print(f"Exported {args.h5} to {args.npz}")
+        return 0
+    return 0 if check_parity(args.h5, args.npz, args.samples) <= args.tolerance else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,73 +2,203 @@ from __future__ import annotations
 
 from constants import *
 
-from collections import Counter
+from fractions import Fraction
+from itertools import combinations
+from math import comb
 
 import numpy as np
 
+NUMBER_OF_SLICE_TYPES = len(CAKE_SLICE_TYPES)
+
+# type mask -> number of types / sorted array of the types in the mask
+MASK_TYPE_COUNT = tuple(bin(mask).count("1") for mask in range(1 << NUMBER_OF_SLICE_TYPES))
+MASK_TYPES = tuple(
+    np.array([slice_type for slice_type in CAKE_SLICE_TYPES if mask >> (slice_type - 1) & 1], dtype=int)
+    for mask in range(1 << NUMBER_OF_SLICE_TYPES)
+)
+for types in MASK_TYPES:
+    types.setflags(write=False)
+
+# plate code -> (counts, mask, size), filled lazily by Plate.set_code
+_DECODED_CODES = {}
+
+def _decode(code: int) -> tuple[tuple[int, ...], int, int]:
+    if code < 0 or code >> PLATE_BITS:
+        raise ValueError(f"Plate code {code} does not fit {MAX_SLICES_PER_PLATE} slices")
+    counts = [0] * NUMBER_OF_SLICE_TYPES
+    remaining = code
+    while remaining:
+        slice_type = remaining & SLICE_MASK
+        if not 1 <= slice_type <= NUMBER_OF_SLICE_TYPES:
+            raise ValueError(f"Invalid slice type {slice_type} in plate code")
+        counts[slice_type - 1] += 1
+        remaining >>= SLICE_BITS
+    mask = sum(1 << index for index, count in enumerate(counts) if count)
+    decoded = _DECODED_CODES[code] = (tuple(counts), mask, sum(counts))
+    return decoded
+
 class Plate:
+    __slots__ = ("counts", "mask", "size")
+
     def __init__(self, slices: np.array):
-        self.slices = slices
+        self.set_plate(slices)
 
     def set_plate(self, slices: np.array):
-        self.slices = slices
+        self.counts = [0] * NUMBER_OF_SLICE_TYPES
+        self.mask = 0
+        self.size = 0
+        for slice_type in slices:
+            self.add_slices(int(slice_type), 1)
+
+    @property
+    def slices(self) -> np.ndarray:
+        return np.repeat(np.arange(1, NUMBER_OF_SLICE_TYPES + 1), self.counts)
+
+    @slices.setter
+    def slices(self, slices: np.array):
+        self.set_plate(slices)
 
     def add_slices(self, slice_type: int, number_of_slices: int) -> int:
-        space_left = MAX_SLICES_PER_PLATE - len(self.slices)
-        actual_added = min(space_left, number_of_slices)
-        self.slices = np.sort(np.concatenate((self.slices,[slice_type] * actual_added)))
+        actual_added = min(MAX_SLICES_PER_PLATE - self.size, number_of_slices)
+        if actual_added > 0:
+            index = int(slice_type) - 1
+            self.counts[index] += actual_added
+            self.mask |= 1 << index
+            self.size += actual_added
         return actual_added
 
     def remove_slices(self, slice_type: int , no_removes: int) -> int:
-        removed_count = min(self.count_slice(slice_type),no_removes)
-        indexes = np.where(self.slices == slice_type)[0]
-        self.slices = np.delete(self.slices,indexes[:removed_count])
-
+        index = int(slice_type) - 1
+        removed_count = min(self.counts[index], no_removes)
+        if removed_count > 0:
+            self.counts[index] -= removed_count
+            if not self.counts[index]:
+                self.mask &= ~(1 << index)
+            self.size -= removed_count
         return removed_count
-    
+
     def count_slice(self, slice_type) -> int:
-        return Counter(self.slices)[slice_type]
+        return self.counts[slice_type - 1] if 1 <= slice_type <= NUMBER_OF_SLICE_TYPES else 0
 
     @property
     def slices_types(self) -> int:
-        return len(Counter(self.slices))
-    
+        return MASK_TYPE_COUNT[self.mask]
+
     @property
     def empty_spaces(self) -> int:
-        return MAX_SLICES_PER_PLATE - len(self.slices)
+        return MAX_SLICES_PER_PLATE - self.size
 
     @property
     def is_clearable(self) -> bool:
-        return len(self.slices) == MAX_SLICES_PER_PLATE and self.slices_types == 1
+        return self.size == MAX_SLICES_PER_PLATE and MASK_TYPE_COUNT[self.mask] == 1
 
     @property
     def is_empty(self) -> bool:
-        return len(self.slices) == 0
+        return self.size == 0
+
+    @property
+    def code(self) -> int:
+        # sorted slices packed SLICE_BITS apiece, the first slice in the lowest bits
+        code = 0
+        shift = 0
+        for slice_type, count in enumerate(self.counts, 1):
+            for _ in range(count):
+                code |= slice_type << shift
+                shift += SLICE_BITS
+        return code
+
+    def set_code(self, code: int):
+        decoded = _DECODED_CODES.get(code)
+        if decoded is None:
+            decoded = _decode(code)
+        counts, self.mask, self.size = decoded
+        self.counts = list(counts)
+
+    @staticmethod
+    def from_code(code: int) -> Plate:
+        plate = Plate(())
+        plate.set_code(code)
+        return plate
 
     def __and__(self, other: Plate) -> np.ndarray | None:
-        common = np.intersect1d(self.slices, other.slices, assume_unique=False)
-        return common if common.size > 0 else None
+        common = self.mask & other.mask
+        return MASK_TYPES[common] if common else None
 
     def __xor__(self, other: Plate) -> bool:
-        return set(self.slices) == set(other.slices)
+        return self.mask == other.mask
 
     def __repr__(self):
-        return "".join(map(lambda x: str(int(x)),self.slices))
-    
-    @staticmethod
-    def generate_plate():
-        total_slices = np.random.randint(1, MAX_SLICES_PER_PLATE - 1)
-        number_of_slice_types = np.random.randint(1, total_slices + 1)
-        chosen_slice_types = np.random.choice(CAKE_SLICE_TYPES, size=number_of_slice_types, replace=False)
+        return "".join(str(slice_type) * count for slice_type, count in enumerate(self.counts, 1))
+
+    def __getstate__(self):
+        return tuple(self.counts)
+
+    def __setstate__(self, state):
+        # pickles written before the count vector stored the sorted slices array
+        if isinstance(state, dict):
+            self.set_plate(state["slices"])
+            return
+        if isinstance(state, tuple) and len(state) == 2 and isinstance(state[1], dict):
+            self.set_plate(state[1]["slices"])
+            return
+        self.counts = list(state)
+        self.mask = sum(1 << index for index, count in enumerate(self.counts) if count)
+        self.size = sum(self.counts)
 
-        base_distribution = np.full(number_of_slice_types, total_slices // number_of_slice_types)
-        remaining = total_slices % number_of_slice_types
-
-        if remaining > 0:
-            indices = np.random.choice(number_of_slice_types, size=remaining, replace=False)
-            base_distribution[indices] += 1
-
-        generated_slices = np.repeat(chosen_slice_types, base_distribution)
-        generated_slices.sort()
+    @staticmethod
+    def from_catalog(plate_id: int) -> Plate:
+        return Plate.from_code(PLATE_CATALOG_CODES[plate_id])
 
-        return Plate(generated_slices)
\ No newline at end of file
+    @staticmethod
+    def generate_plate(rng: np.random.Generator | None = None) -> Plate:
+        return Plate.from_catalog(generate_plates(1, rng)[0])
+
+def _enumerate_generated_plates() -> dict[int, Fraction]:
+    # exact output distribution of the original generator: a uniform total of
+    # 1..MAX_SLICES_PER_PLATE-2 slices, a uniform number of types up to that total,
+    # a uniform set of types and a uniform subset of them getting one extra slice
+    probabilities = {}
+    for total_slices in range(1, MAX_SLICES_PER_PLATE - 1):
+        for number_of_slice_types in range(1, total_slices + 1):
+            per_type, remaining = divmod(total_slices, number_of_slice_types)
+            for chosen_slice_types in combinations(CAKE_SLICE_TYPES, number_of_slice_types):
+                for extra in combinations(chosen_slice_types, remaining):
+                    plate = Plate(())
+                    for slice_type in chosen_slice_types:
+                        plate.add_slices(slice_type, per_type + (slice_type in extra))
+                    probabilities[plate.code] = Fraction(1, MAX_SLICES_PER_PLATE - 2)\
+                        / total_slices\
+                        / comb(NUMBER_OF_SLICE_TYPES, number_of_slice_types)\
+                        / comb(number_of_slice_types, remaining)
+    return probabilities
+
+def _alias_table(probabilities: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Vose's alias method
+    size = len(probabilities)
+    scaled = probabilities * size
+    threshold = np.ones(size)
+    alias = np.arange(size)
+    small = [index for index in range(size) if scaled[index] < 1]
+    large = [index for index in range(size) if scaled[index] >= 1]
+    while small and large:
+        less, more = small.pop(), large.pop()
+        threshold[less] = scaled[less]
+        alias[less] = more
+        scaled[more] -= 1 - scaled[less]
+        (small if scaled[more] < 1 else large).append(more)
+    return threshold, alias
+
+_catalog = _enumerate_generated_plates()
+PLATE_CATALOG_CODES = tuple(sorted(_catalog))
+PLATE_CATALOG_FRACTIONS = tuple(_catalog[code] for code in PLATE_CATALOG_CODES)
+PLATE_CATALOG_PROBABILITIES = np.array([float(probability) for probability in PLATE_CATALOG_FRACTIONS])
+PLATE_CATALOG_COUNTS = np.array([Plate.from_code(code).counts for code in PLATE_CATALOG_CODES], dtype=np.int8)
+_ALIAS_THRESHOLD, _ALIAS_INDEX = _alias_table(PLATE_CATALOG_PROBABILITIES)
+del _catalog
+
+_default_rng = np.random.default_rng()
+
+def generate_plates(n: int, rng: np.random.Generator | None = None) -> np.ndarray:
+    rng = _default_rng if rng is None else rng
+    plate_ids = rng.integers(0, len(PLATE_CATALOG_CODES), n)
+    return np.where(rng.random(n) < _ALIAS_THRESHOLD[plate_ids], plate_ids, _ALIAS_INDEX[plate_ids])
@@ -0,0 +1,21 @@
+import numpy as np
+
+from constants import *
+
+def masked_argmax(q_values: np.ndarray, masks: np.ndarray) -> np.ndarray:
+    return np.where(masks, q_values, -np.inf).argmax(axis=-1)
+
+def epsilon_greedy(q_function, states: np.ndarray, masks: np.ndarray, epsilon: float, rng) -> np.ndarray:
+    # one action per row of states/masks, with a single forward pass for the exploiting rows
+    number_of_states, action_size = masks.shape
+    has_legal = masks.any(axis=1)
+    explore = rng.random(number_of_states) <= epsilon
+
+    # a uniform legal action is the argmax of random keys over the legal cells
+    actions = np.where(masks, rng.random(masks.shape), -1.0).argmax(axis=1)
+    actions[~has_legal] = rng.integers(0, action_size, int((~has_legal).sum()))
+
+    exploit = has_legal & ~explore
+    if exploit.any():
+        actions[exploit] = masked_argmax(np.asarray(q_function(states[exploit])), masks[exploit])
+    return actions
@@ -0,0 +1,61 @@
+import numpy as np
+
+from constants import *
+
+class ReplayBuffer:
+    # Transition i keeps its state in slot i and its next state in slot i + 1, which
+    # the following transition of the same episode overwrites with the same values.
+    # After a terminal transition that slot is reused by the next episode's first state;
+    # when an episode is cut off without one, a slot is skipped to keep its next state.
+    def __init__(self, capacity: int = 20000, state_size: int = STATE_SIZE, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros((capacity, state_size), dtype=np.uint8)
+        self.actions = np.zeros(capacity, dtype=np.int16)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.valid = np.zeros(capacity, dtype=bool)
+        self.last_done = True
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, state, action, reward, next_state, done):
+        position = self.position
+        if not self.last_done and not np.array_equal(self.states[position], state):
+            self.valid[position] = False
+            position = (position + 1) % self.capacity
+            self.size = min(self.size + 1, self.capacity - 1)
+        self.valid[position] = True
+        self.last_done = bool(done)
+        self.states[position] = state
+        self.actions[position] = action
+        self.rewards[position] = reward
+        self.dones[position] = done
+        self.position = (position + 1) % self.capacity
+        self.valid[self.position] = False
+        self.states[self.position] = next_state
+        # one slot always holds the newest next state instead of a transition
+        self.size = min(self.size + 1, self.capacity - 1)
+
+    def sample(self, batch_size: int) -> tuple[np.ndarray, ...]:
+        indexes = self.__draw(batch_size)
+        skipped = ~self.valid[indexes]
+        while skipped.any():
+            indexes[skipped] = self.__draw(int(skipped.sum()))
+            skipped = ~self.valid[indexes]
+        return\
+            self.states[indexes],\
+            self.actions[indexes],\
+            self.rewards[indexes],\
+            self.states[(indexes + 1) % self.capacity],\
+            self.dones[indexes]
+
+    def __draw(self, count: int) -> np.ndarray:
+        return (self.position - self.size + self.rng.integers(0, self.size, count)) % self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        return self.states.nbytes + self.actions.nbytes + self.rewards.nbytes + self.dones.nbytes + self.valid.nbytes
+
+    def __len__(self):
+        return self.size
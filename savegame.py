@@ -0,0 +1,279 @@
+import os
+import queue
+import struct
+import threading
+import zlib
+from typing import NamedTuple
+
+import numpy as np
+
+from constants import *
+from encoding import ZOBRIST_CELLS, code_hash, pack_codes, unpack_codes
+from game import CakeSortGame, GameState
+from plate import Plate
+
+# Snapshot: header, then score, plate counter, interacted slices, the packed board key,
+# every cell's plate number, the packed hand and the PCG64 generator state, all little-endian.
+SNAPSHOT_MAGIC = b"CSSV"
+SNAPSHOT_VERSION = 1
+BOARD_KEY_BYTES = (BOARD_KEY_BITS + 7) // 8
+_HEADER = struct.Struct("<4sH")
+_COUNTERS = struct.Struct("<qII")
+_PLATE_NUMBERS = struct.Struct(f"<{ROWS * COLS}I")
+_HAND = struct.Struct("<BQ")
+_RNG = struct.Struct("<B16s16sBI")
+# counters read from a file must leave room to keep playing without overflowing their fields
+MAX_COUNTER = 1 << 31
+MAX_SCORE = 1 << 62
+SNAPSHOT_SIZE = _HEADER.size + _COUNTERS.size + BOARD_KEY_BYTES + _PLATE_NUMBERS.size + _HAND.size + _RNG.size
+
+# Journal: header, then records of type, payload length, payload and a CRC32 of the three.
+JOURNAL_MAGIC = b"CSJL"
+JOURNAL_VERSION = 1
+CHECKPOINT = 1
+MOVE = 2
+_RECORD = struct.Struct("<BH")
+_MOVE = struct.Struct("<BBB")
+_CRC = struct.Struct("<I")
+
+class SaveFormatError(ValueError):
+    pass
+
+class SavedGame(NamedTuple):
+    state: GameState
+    rng_state: dict
+
+def capture(game) -> SavedGame:
+    # cheap enough for the UI thread; encoding happens later
+    return SavedGame(game.snapshot(), game.rng.bit_generator.state)
+
+def apply(game, saved: SavedGame):
+    game.restore(saved.state)
+    game.rng = np.random.Generator(np.random.PCG64())
+    game.rng.bit_generator.state = saved.rng_state
+    game.mark_all_dirty()
+
+def encode_snapshot(saved: SavedGame) -> bytes:
+    state, rng_state = saved
+    if rng_state["bit_generator"] != "PCG64":
+        raise SaveFormatError(f"Cannot save a {rng_state['bit_generator']} generator")
+    return b"".join((
+        _HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION),
+        _COUNTERS.pack(state.score, state.plate_counter, state.interacted_slices),
+        state.key.to_bytes(BOARD_KEY_BYTES, "little"),
+        _PLATE_NUMBERS.pack(*state.plate_numbers),
+        _HAND.pack(len(state.hand), pack_codes(state.hand)),
+        _RNG.pack(
+            1,
+            rng_state["state"]["state"].to_bytes(16, "little"),
+            rng_state["state"]["inc"].to_bytes(16, "little"),
+            rng_state["has_uint32"],
+            rng_state["uinteger"]
+        )
+    ))
+
+def _plate_code(code: int) -> int:
+    try:
+        canonical = Plate.from_code(code).code
+    except ValueError as error:
+        raise SaveFormatError(str(error)) from error
+    if canonical != code:
+        raise SaveFormatError(f"Plate code {code} is not in canonical order")
+    return code
+
+def decode_snapshot(data: bytes) -> SavedGame:
+    # a damaged or hostile file fails with SaveFormatError instead of giving a game that breaks later:
+    # codes must be canonical, plate numbers must match the occupied cells, the hand must be playable
+    # and the counters must leave room to keep playing and saving
+    if len(data) != SNAPSHOT_SIZE:
+        raise SaveFormatError(f"Snapshot is {len(data)} bytes, expected {SNAPSHOT_SIZE}")
+    magic, version = _HEADER.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise SaveFormatError("Not a cake sort snapshot")
+    if version != SNAPSHOT_VERSION:
+        raise SaveFormatError(f"Unsupported snapshot version {version}")
+    offset = _HEADER.size
+    score, plate_counter, interacted_slices = _COUNTERS.unpack_from(data, offset)
+    offset += _COUNTERS.size
+    key = int.from_bytes(data[offset:offset + BOARD_KEY_BYTES], "little")
+    offset += BOARD_KEY_BYTES
+    plate_numbers = _PLATE_NUMBERS.unpack_from(data, offset)
+    offset += _PLATE_NUMBERS.size
+    hand_size, hand_key = _HAND.unpack_from(data, offset)
+    offset += _HAND.size
+    has_rng, rng_state, rng_inc, has_uint32, uinteger = _RNG.unpack_from(data, offset)
+
+    if not 0 <= score <= MAX_SCORE or not 1 <= plate_counter <= MAX_COUNTER or interacted_slices > MAX_COUNTER:
+        raise SaveFormatError("Corrupt counters")
+    if key >> BOARD_KEY_BITS:
+        raise SaveFormatError("Corrupt board")
+    cell_codes = tuple(_plate_code(code) for code in unpack_codes(key, ROWS * COLS))
+    placed = [number for number in plate_numbers if number]
+    if len(set(placed)) != len(placed) or any(number >= plate_counter for number in placed):
+        raise SaveFormatError("Corrupt plate numbers")
+    if any(bool(number) != bool(code) for number, code in zip(plate_numbers, cell_codes)):
+        raise SaveFormatError("Plate numbers do not match the board")
+    if not 1 <= hand_size <= PLATES_PER_HAND or hand_key >> (hand_size * PLATE_BITS):
+        raise SaveFormatError("Corrupt hand")
+    hand = tuple(_plate_code(code) for code in unpack_codes(hand_key, hand_size))
+    if not all(hand):
+        raise SaveFormatError("Empty plate in hand")
+    if has_rng != 1 or has_uint32 > 1:
+        raise SaveFormatError("Corrupt generator state")
+
+    zobrist = 0
+    for index, code in enumerate(cell_codes):
+        zobrist ^= code_hash(ZOBRIST_CELLS[index], code)
+    state = GameState(
+        cell_codes, plate_numbers, hand, score, plate_counter, interacted_slices, frozenset(), key, zobrist
+    )
+    rng_state = {
+        "bit_generator": "PCG64",
+        "state": {"state": int.from_bytes(rng_state, "little"), "inc": int.from_bytes(rng_inc, "little")},
+        "has_uint32": has_uint32,
+        "uinteger": uinteger
+    }
+    return SavedGame(state, rng_state)
+
+def game_from_saved(saved: SavedGame) -> CakeSortGame:
+    game = CakeSortGame()
+    apply(game, saved)
+    return game
+
+def play_move(game, plate_index: int, row: int, column: int):
+    # a move exactly as the GUI plays it: place, clean up, refill an empty hand
+    game.place_plate(plate_index, row, column)
+    game.cleanup_empty_plates()
+    if not game.current_plates:
+        game.reset_plates()
+
+def _record(record_type: int, payload: bytes) -> bytes:
+    head = _RECORD.pack(record_type, len(payload))
+    return head + payload + _CRC.pack(zlib.crc32(head + payload))
+
+def _read_records(data: bytes):
+    # stops at the first torn or damaged record, which is where a crash would have cut the file
+    offset = _HEADER.size
+    while offset + _RECORD.size <= len(data):
+        record_type, length = _RECORD.unpack_from(data, offset)
+        end = offset + _RECORD.size + length
+        if end + _CRC.size > len(data):
+            return
+        (crc,) = _CRC.unpack_from(data, end)
+        if crc != zlib.crc32(data[offset:end]):
+            return
+        yield record_type, data[offset + _RECORD.size:end]
+        offset = end + _CRC.size
+
+def load_snapshot(path: str) -> CakeSortGame:
+    with open(path, "rb") as file:
+        return game_from_saved(decode_snapshot(file.read(SNAPSHOT_SIZE + 1)))
+
+def load_journal(path: str, max_bytes: int = 1 << 22) -> CakeSortGame:
+    # the latest checkpoint plus the moves recorded after it
+    with open(path, "rb") as file:
+        data = file.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise SaveFormatError("Journal is too large")
+    if len(data) < _HEADER.size or _HEADER.unpack_from(data) != (JOURNAL_MAGIC, JOURNAL_VERSION):
+        raise SaveFormatError("Not a cake sort journal")
+
+    checkpoint = None
+    moves = []
+    for record_type, payload in _read_records(data):
+        if record_type == CHECKPOINT:
+            checkpoint = payload
+            moves.clear()
+        elif record_type == MOVE and len(payload) == _MOVE.size:
+            moves.append(_MOVE.unpack(payload))
+        else:
+            raise SaveFormatError(f"Unknown journal record {record_type}")
+    if checkpoint is None:
+        raise SaveFormatError("Journal has no checkpoint")
+
+    game = game_from_saved(decode_snapshot(checkpoint))
+    for plate_index, row, column in moves:
+        if plate_index >= len(game.current_plates) or row >= ROWS or column >= COLS or game.board.get_plate_number(row, column):
+            raise SaveFormatError(f"Illegal move {plate_index, row, column} in journal")
+        play_move(game, plate_index, row, column)
+    return game
+
+class SaveWriter:
+    # one background thread does every file write, so saving costs the caller a queue put
+    def __init__(self):
+        self.tasks = queue.Queue()
+        self.thread = threading.Thread(target=self.__run, name="save-writer", daemon=True)
+        self.thread.start()
+
+    def __run(self):
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is None:
+                    return
+                task()
+            except Exception as error:
+                print("Save failed:", repr(error))
+            finally:
+                self.tasks.task_done()
+
+    def submit(self, task):
+        self.tasks.put(task)
+
+    def save_snapshot(self, game, path: str):
+        saved = capture(game)
+        self.submit(lambda: write_atomic(path, encode_snapshot(saved)))
+
+    def flush(self):
+        self.tasks.join()
+
+    def close(self):
+        self.tasks.put(None)
+        self.thread.join()
+
+def write_atomic(path: str, data: bytes):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+class GameJournal:
+    # append-only autosave: a checkpoint every checkpoint_every moves, move records in between;
+    # once the file passes max_bytes it is rewritten as just the newest checkpoint
+    def __init__(self, path: str, writer: SaveWriter, checkpoint_every: int = 32, max_bytes: int = 64 * 1024):
+        self.path = path
+        self.writer = writer
+        self.checkpoint_every = checkpoint_every
+        self.max_bytes = max_bytes
+        self.moves_since_checkpoint = 0
+        self.size = 0
+
+    def checkpoint(self, game):
+        saved = capture(game)
+        self.moves_since_checkpoint = 0
+        self.writer.submit(lambda: self.__write_checkpoint(saved))
+
+    def record_move(self, game, plate_index: int, row: int, column: int):
+        # call after the move has been played
+        if self.moves_since_checkpoint + 1 >= self.checkpoint_every:
+            self.checkpoint(game)
+            return
+        self.moves_since_checkpoint += 1
+        record = _record(MOVE, _MOVE.pack(plate_index, row, column))
+        self.writer.submit(lambda: self.__append(record))
+
+    def __write_checkpoint(self, saved: SavedGame):
+        record = _record(CHECKPOINT, encode_snapshot(saved))
+        if not self.size or self.size + len(record) > self.max_bytes:
+            data = _HEADER.pack(JOURNAL_MAGIC, JOURNAL_VERSION) + record
+            write_atomic(self.path, data)
+            self.size = len(data)
+        else:
+            self.__append(record)
+
+    def __append(self, record: bytes):
+        with open(self.path, "ab") as file:
+            file.write(record)
+        self.size += len(record)
@@ -0,0 +1,91 @@
+import base64
+import io
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageDraw
+
+from constants import *
+
+class SpriteAssets:
+    # textures and pie-slice masks resized once for one sprite size
+    def __init__(self, size: int, textures: list):
+        self.size = size
+        self.textures = [texture.resize((size, size)) for texture in textures]
+        angle_per_slice = 360 / MAX_SLICES_PER_PLATE
+        self.masks = []
+        for index in range(MAX_SLICES_PER_PLATE):
+            mask = Image.new("L", (size, size), 0)
+            ImageDraw.Draw(mask).pieslice(
+                [2, 2, size - 2, size - 2], start=index * angle_per_slice, end=(index + 1) * angle_per_slice, fill=255
+            )
+            self.masks.append(mask)
+        self.colors = {}
+
+    def fill(self, slice_type: int) -> Image.Image:
+        texture_index = slice_type - 1
+        if 0 <= texture_index < len(self.textures):
+            return self.textures[texture_index]
+        if slice_type not in self.colors:
+            self.colors[slice_type] = Image.new("RGBA", (self.size, self.size), CAKE_TYPE_COLORS.get(slice_type, "#888888"))
+        return self.colors[slice_type]
+
+class SpriteCache:
+    # base64 PNGs of plates keyed by (plate code, size); the code is the sorted slice multiset.
+    # Safe to share between threads: textures may be swapped while handlers draw, and a sprite
+    # rendered with the old textures is returned but not cached.
+    def __init__(self, textures: list | None = None, capacity: int = 512):
+        self.textures = textures or []
+        self.capacity = capacity
+        self.assets = {}
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def set_textures(self, textures: list):
+        with self.lock:
+            self.textures = textures
+            self.generation += 1
+            self.assets.clear()
+            self.sprites.clear()
+
+    def invalidate(self, size: int):
+        # drops one size bucket, other sizes keep their sprites
+        with self.lock:
+            self.generation += 1
+            self.assets.pop(size, None)
+            for key in [key for key in self.sprites if key[1] == size]:
+                del self.sprites[key]
+
+    def get(self, plate, size: int) -> str:
+        key = (plate.code, size)
+        with self.lock:
+            sprite = self.sprites.get(key)
+            if sprite is not None:
+                self.sprites.move_to_end(key)
+                self.hits += 1
+                return sprite
+            self.misses += 1
+            generation = self.generation
+        # rendering takes milliseconds, so other threads may use the cache meanwhile
+        sprite = self.render(plate, size)
+        with self.lock:
+            if generation == self.generation:
+                self.sprites[key] = sprite
+                if len(self.sprites) > self.capacity:
+                    self.sprites.popitem(last=False)
+        return sprite
+
+    def render(self, plate, size: int) -> str:
+        with self.lock:
+            assets = self.assets.get(size)
+            if assets is None:
+                assets = self.assets[size] = SpriteAssets(size, self.textures)
+        image = Image.new("RGBA", (size, size), (255, 255, 255, 0))
+        for index, slice_type in enumerate(plate.slices):
+            image.paste(assets.fill(int(slice_type)), (0, 0), assets.masks[index])
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return base64.b64encode(buffer.getvalue()).decode()
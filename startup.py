@@ -0,0 +1,53 @@
+import os
+import threading
+import time
+
+from metrics import PhaseTimer
+
+STARTUP_START = time.perf_counter()
+# phases of the current process's startup; background tasks add theirs when they finish
+STARTUP = PhaseTimer()
+
+class BackgroundTask:
+    # runs loader on a daemon thread so startup can go on; result stays None until it is ready
+    def __init__(self, name: str, loader, on_ready=None, timer: PhaseTimer = STARTUP):
+        self.name = name
+        self.result = None
+        self.error = None
+        self.finished = threading.Event()
+        self.thread = threading.Thread(target=self.__run, args=(loader, on_ready, timer), name=name, daemon=True)
+        self.thread.start()
+
+    def __run(self, loader, on_ready, timer):
+        start = time.perf_counter()
+        try:
+            self.result = loader()
+        except Exception as error:
+            self.error = error
+            print(f"{self.name} failed: {error!r}")
+        finally:
+            timer.add(self.name, time.perf_counter() - start)
+            self.finished.set()
+        if self.error is None and on_ready is not None:
+            on_ready(self.result)
+
+    @property
+    def ready(self) -> bool:
+        return self.finished.is_set() and self.error is None
+
+    def wait(self, timeout: float | None = None):
+        self.finished.wait(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+def startup_report(title: str = "Startup", timer: PhaseTimer = STARTUP) -> str:
+    lines = [f"{title}: {1000 * (time.perf_counter() - STARTUP_START):.1f} ms since startup began"]
+    for name, seconds in list(timer.totals.items()):
+        lines.append(f"  {name:<32} {1000 * seconds:9.1f} ms")
+    return "\n".join(lines)
+
+def print_startup_report(title: str = "Startup", timer: PhaseTimer = STARTUP):
+    # opt-in, so normal runs stay quiet
+    if os.environ.get("CAKESORT_STARTUP_REPORT"):
+        print(startup_report(title, timer))
@@ -0,0 +1,73 @@
+import numpy as np
+
+from constants import *
+
+# identity, top-bottom mirror, left-right mirror and 180 degree rotation; each is its own inverse.
+# The merge rules only break ties by neighbour order, so about 1.5% of random placements
+# resolve differently from their mirror image.
+SYMMETRY_NAMES = ("identity", "flip_rows", "flip_columns", "rotate_180")
+NUMBER_OF_SYMMETRIES = len(SYMMETRY_NAMES)
+
+def _cell_map(flip_rows: bool, flip_columns: bool) -> np.ndarray:
+    rows, columns = np.divmod(np.arange(ROWS * COLS), COLS)
+    if flip_rows:
+        rows = ROWS - 1 - rows
+    if flip_columns:
+        columns = COLS - 1 - columns
+    return rows * COLS + columns
+
+# CELL_MAPS[symmetry][cell] is where the symmetry sends cell, which is also the action mapping
+CELL_MAPS = np.stack([_cell_map(False, False), _cell_map(True, False), _cell_map(False, True), _cell_map(True, True)])
+
+def _state_map(cell_map: np.ndarray) -> np.ndarray:
+    # board cells move as blocks of MAX_SLICES_PER_PLATE values, the hand part stays in place
+    board = (cell_map[:, np.newaxis] * MAX_SLICES_PER_PLATE + np.arange(MAX_SLICES_PER_PLATE)).ravel()
+    state_map = np.arange(STATE_SIZE)
+    state_map[board] = np.arange(BOARD_STATE_SIZE)
+    return state_map
+
+# transformed_state = state[..., STATE_MAPS[symmetry]]
+STATE_MAPS = np.stack([_state_map(cell_map) for cell_map in CELL_MAPS])
+
+for _table in (CELL_MAPS, STATE_MAPS):
+    _table.flags.writeable = False
+
+def transform_states(states: np.ndarray, symmetry: int) -> np.ndarray:
+    return states[..., STATE_MAPS[symmetry]]
+
+def transform_actions(actions, symmetry: int):
+    return CELL_MAPS[symmetry][actions]
+
+def transform_q_values(q_values: np.ndarray, symmetry: int) -> np.ndarray:
+    # maps Q-values over transformed actions back onto the original actions
+    return q_values[..., CELL_MAPS[symmetry]]
+
+def canonicalize(state: np.ndarray) -> tuple[np.ndarray, int]:
+    # the orientation with the smallest byte string; map actions back with transform_actions
+    variants = state[STATE_MAPS]
+    keys = [variant.tobytes() for variant in variants]
+    symmetry = min(range(NUMBER_OF_SYMMETRIES), key=keys.__getitem__)
+    return variants[symmetry], symmetry
+
+def canonical_key(state: np.ndarray) -> bytes:
+    return min(variant.tobytes() for variant in state[STATE_MAPS])
+
+def augment(states, actions, rewards, next_states, dones) -> tuple[np.ndarray, ...]:
+    # every transition in all four orientations
+    return\
+        np.concatenate([transform_states(states, symmetry) for symmetry in range(NUMBER_OF_SYMMETRIES)]),\
+        np.concatenate([transform_actions(actions, symmetry) for symmetry in range(NUMBER_OF_SYMMETRIES)]).astype(actions.dtype),\
+        np.tile(rewards, NUMBER_OF_SYMMETRIES),\
+        np.concatenate([transform_states(next_states, symmetry) for symmetry in range(NUMBER_OF_SYMMETRIES)]),\
+        np.tile(dones, NUMBER_OF_SYMMETRIES)
+
+def random_symmetries(states, actions, rewards, next_states, dones, rng) -> tuple[np.ndarray, ...]:
+    # every transition in one random orientation, so the batch size stays the same
+    symmetries = rng.integers(0, NUMBER_OF_SYMMETRIES, len(actions))
+    state_maps = STATE_MAPS[symmetries]
+    return\
+        np.take_along_axis(states, state_maps, axis=1),\
+        CELL_MAPS[symmetries, actions].astype(actions.dtype),\
+        rewards,\
+        np.take_along_axis(next_states, state_maps, axis=1),\
+        dones
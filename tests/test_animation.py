@@ -0,0 +1,103 @@
+import sys
+import threading
+import time
+
+from animation import AnimationScheduler, SpritePool
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_flights_follow_wall_clock():
+    clock = Clock()
+    scheduler = AnimationScheduler(duration=1.0, stagger=0.5, clock=clock)
+    moves = [{"source_row": 0, "source_column": 0, "destination_row": 0, "destination_column": 1, "slice_type": 2, "count": 2}]
+    assert scheduler.launch_moves(moves, lambda row, column: (column * 10.0, row * 10.0)) == 2
+    clock.now = 0.25
+    active, finished = scheduler.frame()
+    assert [progress for _, progress in active] == [0.25] and not finished
+    # a late frame skips ahead rather than slowing the flight down
+    clock.now = 1.25
+    active, finished = scheduler.frame()
+    assert [progress for _, progress in active] == [0.75] and len(finished) == 1
+    scheduler.skip()
+    active, finished = scheduler.frame()
+    assert not active and len(finished) == 1 and not scheduler.active
+
+def test_flight_lands_on_destination():
+    scheduler = AnimationScheduler(clock=Clock())
+    flight = scheduler.launch((0.0, 0.0), (30.0, 40.0), 1)
+    assert flight.position(0.0) == (0.0, 0.0, 1.0)
+    assert flight.position(1.0) == (30.0, 40.0, 1.0)
+
+def test_pool_reuses_released_sprites():
+    created = []
+    pool = SpritePool(lambda slice_type: created.append(slice_type) or object())
+    sprite = pool.acquire(1)
+    assert pool.release(1, sprite)
+    assert pool.acquire(1) is sprite
+    assert pool.acquire(2) is not sprite
+    assert created == [1, 2]
+
+def test_pool_discards_sprites_in_flight_during_clear():
+    pool = SpritePool(lambda slice_type: object())
+    idle = pool.acquire(1)
+    in_flight = pool.acquire(1)
+    pool.release(1, idle)
+    assert pool.clear() == [idle]
+    assert not pool.release(1, in_flight)
+    assert pool.acquire(1) not in (idle, in_flight)
+
+def test_pool_clear_races_with_flights():
+    # the overlay must hold every sprite exactly until the pool hands it back through clear() or a refused release()
+    overlay = set()
+    overlay_lock = threading.Lock()
+    errors = []
+
+    def create(slice_type):
+        sprite = object()
+        with overlay_lock:
+            overlay.add(sprite)
+        return sprite
+
+    def remove(sprite):
+        with overlay_lock:
+            overlay.remove(sprite)
+
+    pool = SpritePool(create)
+    stop = threading.Event()
+
+    def fly(slice_type):
+        try:
+            while not stop.is_set():
+                sprites = [pool.acquire(slice_type) for _ in range(3)]
+                with overlay_lock:
+                    assert all(sprite in overlay for sprite in sprites)
+                for sprite in sprites:
+                    if not pool.release(slice_type, sprite):
+                        remove(sprite)
+        except Exception as error:
+            errors.append(error)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        flights = [threading.Thread(target=fly, args=(slice_type,)) for slice_type in (1, 1, 2)]
+        for thread in flights:
+            thread.start()
+        deadline = time.perf_counter() + 0.5
+        while time.perf_counter() < deadline:
+            for sprite in pool.clear():
+                remove(sprite)
+    finally:
+        stop.set()
+        for thread in flights:
+            thread.join()
+        sys.setswitchinterval(switch_interval)
+    assert not errors
+    for sprite in pool.clear():
+        remove(sprite)
+    assert not overlay
@@ -0,0 +1,23 @@
+import json
+
+import benchmark
+
+def run_cli(tmp_path, *arguments) -> dict:
+    output = tmp_path / "results.json"
+    assert benchmark.main([*arguments, "--repeat", "1", "--output", str(output)]) == 0
+    with open(output) as file:
+        return json.load(file)["results"]
+
+def test_default_run_without_model(tmp_path, monkeypatch):
+    # no cake_sort_model.h5 in the working directory: the model benchmarks are skipped, the rest still report
+    monkeypatch.chdir(tmp_path)
+    results = run_cli(tmp_path)
+    assert set(results) == set(benchmark.BENCHMARKS)
+    assert "skipped" in results["model.predict[1]"] and "skipped" in results["model.predict[64]"]
+    assert results["env.step"]["ops"] > 0
+
+def test_unreadable_model_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "cake_sort_model.h5").write_bytes(b"not an hdf5 file")
+    results = run_cli(tmp_path, "model.predict[1]", "model.predict[64]")
+    assert all("skipped" in result for result in results.values())
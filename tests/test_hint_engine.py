@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+
+from evaluate import expectimax_policy, play, random_policy
+from game import CakeSortGame
+from hint_engine import HintEngine
+
+def test_best_move_is_legal_and_leaves_game_unchanged():
+    game = CakeSortGame(0)
+    rng = np.random.default_rng(0)
+    for _ in range(15):
+        before = game.snapshot()
+        generator = game.rng.bit_generator.state
+        hint = HintEngine(time_budget=math.inf, node_budget=300, seed=0).best_move(game)
+        assert game.snapshot() == before
+        assert game.rng.bit_generator.state == generator
+        assert hint.plate_index < len(game.current_plates)
+        assert game.board.get_plate_number(hint.row, hint.column) == 0
+        assert 1 <= hint.depth and hint.nodes <= 301
+        game.place_plate(*random_policy(game, rng))
+        game.cleanup_empty_plates()
+        if not game.current_plates:
+            game.reset_plates()
+
+def test_node_budget_is_deterministic():
+    game = CakeSortGame(1)
+    hints = [HintEngine(time_budget=math.inf, node_budget=500, seed=1).best_move(game) for _ in range(2)]
+    assert hints[0] == hints[1]
+
+def test_full_board_has_no_hint():
+    game = CakeSortGame(2)
+    game.board.plate_number_map[:] = 1
+    assert HintEngine().best_move(game) is None
+
+def test_outlasts_random_policy(cap=60):
+    # seeded games capped at cap placements; random play fills the board long before that
+    hint_policy = expectimax_policy("300")
+    hint_moves = [play(hint_policy, 0, index, cap)[1] for index in range(3)]
+    random_moves = [play(random_policy, 0, index, cap)[1] for index in range(3)]
+    assert min(hint_moves) == cap
+    assert max(random_moves) < cap
@@ -0,0 +1,53 @@
+import csv
+import json
+import math
+import random
+import statistics
+
+from metrics import MetricsWriter, PhaseTimer, RunningStats
+
+def test_running_stats_match_statistics():
+    rng = random.Random(0)
+    stats = RunningStats()
+    values = []
+    for _ in range(501):
+        values.append(rng.uniform(-10, 10))
+        stats.add(values[-1])
+        assert stats.median == statistics.median(values)
+    assert math.isclose(stats.mean, statistics.mean(values))
+    assert math.isclose(stats.variance, statistics.variance(values))
+    assert (stats.min, stats.max) == (min(values), max(values))
+
+def test_phase_timer_reports_every_listed_phase():
+    timer = PhaseTimer(("act", "update"))
+    with timer.phase("act"):
+        pass
+    totals = timer.reset()
+    assert list(totals) == ["act", "update"] and totals["update"] == 0.0 and totals["act"] > 0
+    assert timer.reset() == {"act": 0.0, "update": 0.0}
+
+def test_jsonl_is_strict_json(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    with MetricsWriter(path) as writer:
+        writer.write({"episode": 1, "mean_loss": None, "score_std": math.nan, "best": -math.inf})
+        writer.write({"episode": 2, "mean_loss": 0.5, "score_std": 1.0, "best": 3.0})
+
+    def reject(constant):
+        raise ValueError(f"non-standard JSON constant {constant}")
+
+    with open(path) as file:
+        records = [json.loads(line, parse_constant=reject) for line in file]
+    assert records[0] == {"episode": 1, "mean_loss": None, "score_std": None, "best": None}
+    assert records[1]["mean_loss"] == 0.5
+
+def test_csv_keeps_fixed_columns(tmp_path):
+    path = str(tmp_path / "metrics.csv")
+    fieldnames = ["episode", "mean_loss", "time_update"]
+    with MetricsWriter(path, fieldnames) as writer:
+        writer.write({"episode": 1, "mean_loss": None, "time_update": 0.0, "extra": 1})
+        writer.write({"episode": 2, "mean_loss": 0.25, "time_update": 0.1})
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert list(rows[0]) == fieldnames
+    assert rows[0] == {"episode": "1", "mean_loss": "", "time_update": "0.0"}
+    assert rows[1]["mean_loss"] == "0.25"
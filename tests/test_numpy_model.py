@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+from constants import *
+from numpy_model import NumpyModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+# Keras outputs of the shipped dense model and of a seeded train.build_model() conv model,
+# written by `PYTHONPATH=. python tests/test_numpy_model.py` with TensorFlow installed
+KERAS_OUTPUTS = os.path.join(FIXTURES, "keras_outputs.npz")
+CONV_MODEL = os.path.join(FIXTURES, "conv_model.h5")
+MODELS = {
+    "dense": os.path.join(ROOT, "cake_sort_model.h5"),
+    "conv": CONV_MODEL
+}
+TOLERANCE = 1e-4
+
+def make_states(seed: int, count: int = 64) -> np.ndarray:
+    return np.random.default_rng(seed).integers(0, len(CAKE_SLICE_TYPES) + 1, (count, STATE_SIZE)).astype(np.float32)
+
+@pytest.fixture(scope="module")
+def keras_outputs():
+    with np.load(KERAS_OUTPUTS) as data:
+        return dict(data)
+
+@pytest.mark.parametrize("name", MODELS)
+def test_batched_matches_keras(keras_outputs, name):
+    model = NumpyModel.from_h5(MODELS[name])
+    outputs = model(keras_outputs[f"{name}_states"])
+    np.testing.assert_allclose(outputs, keras_outputs[f"{name}_expected"], atol=TOLERANCE)
+
+@pytest.mark.parametrize("name", MODELS)
+def test_single_state_matches_keras(keras_outputs, name):
+    model = NumpyModel.from_h5(MODELS[name])
+    for state, expected in zip(keras_outputs[f"{name}_states"], keras_outputs[f"{name}_expected"]):
+        output = model(state)
+        assert output.shape == expected.shape
+        np.testing.assert_allclose(output, expected, atol=TOLERANCE)
+
+def test_shipped_npz_matches_keras(keras_outputs):
+    model = NumpyModel.load(os.path.join(ROOT, "cake_sort_model.npz"))
+    np.testing.assert_allclose(model(keras_outputs["dense_states"]), keras_outputs["dense_expected"], atol=TOLERANCE)
+
+def test_npz_round_trip(tmp_path):
+    model = NumpyModel.from_h5(CONV_MODEL)
+    model.save(tmp_path / "conv.npz")
+    states = make_states(1)
+    np.testing.assert_array_equal(NumpyModel.load(str(tmp_path / "conv.npz"))(states), model(states))
+
+@pytest.mark.parametrize("name", MODELS)
+def test_matches_live_keras(name):
+    pytest.importorskip("tensorflow")
+    from numpy_model import load_keras_model
+
+    states = make_states(2)
+    expected = load_keras_model(MODELS[name]).predict(states, verbose=0)
+    model = NumpyModel.from_h5(MODELS[name])
+    np.testing.assert_allclose(model(states), expected, atol=TOLERANCE)
+    np.testing.assert_allclose(model(states[0]), expected[0], atol=TOLERANCE)
+
+def test_matches_fresh_train_model(tmp_path):
+    pytest.importorskip("tensorflow")
+    import train
+
+    keras_model = train.build_model()
+    keras_model.save(tmp_path / "model.h5")
+    states = make_states(3)
+    np.testing.assert_allclose(
+        NumpyModel.from_h5(str(tmp_path / "model.h5"))(states), keras_model.predict(states, verbose=0), atol=TOLERANCE
+    )
+
+def write_fixtures():
+    from tensorflow.keras.utils import set_random_seed
+    import train
+    from numpy_model import load_keras_model
+
+    set_random_seed(0)
+    train.build_model().save(CONV_MODEL)
+    outputs = {}
+    for seed, name in enumerate(MODELS):
+        states = make_states(seed)
+        outputs[f"{name}_states"] = states.astype(np.uint8)
+        outputs[f"{name}_expected"] = load_keras_model(MODELS[name]).predict(states, verbose=0)
+    np.savez_compressed(KERAS_OUTPUTS, **outputs)
+
+if __name__ == "__main__":
+    write_fixtures()
@@ -0,0 +1,41 @@
+import numpy as np
+
+from env import Env
+from replay import ReplayBuffer
+
+def fill(memory, env, steps, rng) -> set:
+    # the same loop as train.train: the previous observation is kept as a copy
+    played = set()
+    state = env.reset().copy()
+    for _ in range(steps):
+        free = np.flatnonzero(env.get_action_mask())
+        if not len(free):
+            state = env.reset().copy()
+            continue
+        next_state, score, bonus, done = env.step(int(rng.choice(free)))
+        memory.add(state, 0, score + bonus, next_state, done)
+        played.add((state.tobytes(), next_state.tobytes(), bool(done)))
+        state = next_state.copy()
+        if done:
+            state = env.reset().copy()
+    return played
+
+def test_env_states_share_one_buffer():
+    env = Env(seed=0)
+    state = env.reset()
+    next_state = env.step(int(np.flatnonzero(env.get_action_mask())[0]))[0]
+    assert np.shares_memory(state, next_state)
+
+def test_sampled_states_differ_from_next_states():
+    memory = ReplayBuffer(500, seed=0)
+    fill(memory, Env(seed=0), 2000, np.random.default_rng(0))
+    states, actions, rewards, next_states, dones = memory.sample(256)
+    assert (~dones).any()
+    assert (states != next_states).any(axis=1)[~dones].all()
+
+def test_sampled_transitions_were_played():
+    memory = ReplayBuffer(1000, seed=1)
+    played = fill(memory, Env(seed=1), 300, np.random.default_rng(1))
+    states, _, _, next_states, dones = memory.sample(128)
+    for state, next_state, done in zip(states, next_states, dones):
+        assert (state.tobytes(), next_state.tobytes(), bool(done)) in played
@@ -0,0 +1,219 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from constants import *
+from evaluate import random_policy
+from game import CakeSortGame
+import savegame
+from savegame import SaveFormatError
+
+def played_game(seed: int, placements: int) -> CakeSortGame:
+    game = CakeSortGame(seed)
+    rng = np.random.default_rng(seed)
+    for _ in range(placements):
+        move = random_policy(game, rng)
+        if move is None:
+            break
+        savegame.play_move(game, *move)
+    return game
+
+def assert_same_game(game, other):
+    # dirty cells only drive redraws and are not saved
+    assert game.snapshot()._replace(dirty_cells=None) == other.snapshot()._replace(dirty_cells=None)
+    assert game.rng.bit_generator.state == other.rng.bit_generator.state
+
+def encoded(game) -> bytes:
+    return savegame.encode_snapshot(savegame.capture(game))
+
+def test_snapshot_round_trip():
+    for seed in range(100):
+        game = played_game(seed, seed % 40)
+        data = encoded(game)
+        assert len(data) == savegame.SNAPSHOT_SIZE
+        loaded = savegame.game_from_saved(savegame.decode_snapshot(data))
+        assert_same_game(game, loaded)
+        # the generator continues where it was, so both games draw the same plates
+        game.reset_plates()
+        loaded.reset_plates()
+        assert_same_game(game, loaded)
+
+def test_writer_saves_snapshot_files(tmp_path):
+    writer = savegame.SaveWriter()
+    game = played_game(1, 12)
+    path = str(tmp_path / "game.cks")
+    writer.save_snapshot(game, path)
+    writer.close()
+    assert_same_game(game, savegame.load_snapshot(path))
+    assert not os.path.exists(path + ".tmp")
+
+def play_journaled(tmp_path, seed: int, checkpoint_every: int = 7, max_bytes: int = 64 * 1024):
+    # yields the live game after every move with its journal flushed to disk
+    writer = savegame.SaveWriter()
+    path = str(tmp_path / f"autosave_{seed}.journal")
+    journal = savegame.GameJournal(path, writer, checkpoint_every, max_bytes)
+    game = CakeSortGame(seed)
+    rng = np.random.default_rng(seed)
+    journal.checkpoint(game)
+    try:
+        while (move := random_policy(game, rng)) is not None:
+            savegame.play_move(game, *move)
+            journal.record_move(game, *move)
+            writer.flush()
+            yield path, game
+    finally:
+        writer.close()
+
+def test_journal_replays_to_live_game(tmp_path):
+    for seed in range(10):
+        for path, game in play_journaled(tmp_path, seed):
+            loaded = savegame.load_journal(path)
+            assert_same_game(game, loaded)
+        # replay restores the generator too, so play continues identically
+        rng = np.random.default_rng(seed)
+        for _ in range(5):
+            if (move := random_policy(game, rng)) is None:
+                break
+            savegame.play_move(game, *move)
+            savegame.play_move(loaded, *move)
+        assert_same_game(game, loaded)
+
+def test_torn_tail_loads_previous_move(tmp_path):
+    previous = None
+    for path, game in play_journaled(tmp_path, 3):
+        if previous is not None and savegame.load_journal(path).snapshot() != previous.snapshot():
+            with open(path, "rb") as file:
+                data = file.read()
+            # every cut inside the last move record falls back to the position before it
+            for cut in range(1, savegame._RECORD.size + savegame._MOVE.size + savegame._CRC.size):
+                with open(path, "wb") as file:
+                    file.write(data[:-cut])
+                assert_same_game(previous, savegame.load_journal(path))
+            return
+        previous = game.clone()
+    pytest.fail("no move record was journaled")
+
+def test_journal_compacts_past_max_bytes(tmp_path):
+    max_bytes = 1024
+    slack = 7 * (savegame._RECORD.size + savegame._MOVE.size + savegame._CRC.size)
+    sizes = []
+    for seed in range(5):
+        for path, game in play_journaled(tmp_path, seed, max_bytes=max_bytes):
+            sizes.append(os.path.getsize(path))
+            assert sizes[-1] <= max_bytes + slack
+            assert_same_game(game, savegame.load_journal(path))
+    # a compaction starts over from the header and one checkpoint
+    assert any(later < earlier for earlier, later in zip(sizes, sizes[1:]))
+
+def patched(data: bytes, offset: int, layout, *values) -> bytes:
+    data = bytearray(data)
+    layout.pack_into(data, offset, *values)
+    return bytes(data)
+
+COUNTERS = savegame._HEADER.size
+BOARD = COUNTERS + savegame._COUNTERS.size
+PLATE_NUMBERS = BOARD + savegame.BOARD_KEY_BYTES
+HAND = PLATE_NUMBERS + savegame._PLATE_NUMBERS.size
+RNG = HAND + savegame._HAND.size
+
+@pytest.fixture
+def snapshot():
+    game = played_game(5, 8)
+    assert 0 < np.count_nonzero(game.board.plate_number_map) < ROWS * COLS
+    return game, encoded(game)
+
+def test_rejects_bad_header(snapshot):
+    _, data = snapshot
+    for bad in (b"", data[:-1], data + b"\0", b"XXXX" + data[4:], patched(data, 0, savegame._HEADER, b"CSSV", 2)):
+        with pytest.raises(SaveFormatError):
+            savegame.decode_snapshot(bad)
+
+def test_rejects_counters_that_would_overflow(snapshot):
+    game, data = snapshot
+    for counters in (
+        (game.score, 2 ** 32 - 1, game.interacted_slices),
+        (game.score, 0, game.interacted_slices),
+        (game.score, game.plate_counter, 2 ** 32 - 1),
+        (-1, game.plate_counter, game.interacted_slices),
+        (2 ** 63 - 1, game.plate_counter, game.interacted_slices)
+    ):
+        with pytest.raises(SaveFormatError):
+            savegame.decode_snapshot(patched(data, COUNTERS, savegame._COUNTERS, *counters))
+
+def test_rejects_plate_numbers_that_do_not_match_the_board(snapshot):
+    game, data = snapshot
+    numbers = list(game.board.plate_number_map.ravel())
+    empty = numbers.index(0)
+    occupied = next(index for index, number in enumerate(numbers) if number)
+    unused = next(number for number in range(1, game.plate_counter) if number not in numbers)
+    for change in ({empty: unused}, {occupied: 0}, {occupied: game.plate_counter}, {empty: numbers[occupied]}):
+        bad_numbers = [change.get(index, number) for index, number in enumerate(numbers)]
+        with pytest.raises(SaveFormatError):
+            savegame.decode_snapshot(patched(data, PLATE_NUMBERS, savegame._PLATE_NUMBERS, *bad_numbers))
+
+def test_rejects_unplayable_hands(snapshot):
+    game, data = snapshot
+    codes = [plate.code for plate in game.current_plates]
+    for hand_size, hand_key in (
+        (0, 0),
+        (PLATES_PER_HAND + 1, 0),
+        (1, codes[0] | 1 << PLATE_BITS),
+        (2, codes[0])
+    ):
+        with pytest.raises(SaveFormatError):
+            savegame.decode_snapshot(patched(data, HAND, savegame._HAND, hand_size, hand_key))
+
+def test_rejects_invalid_plate_codes(snapshot):
+    game, data = snapshot
+    key = game.board.key
+    occupied = int(np.flatnonzero(game.board.plate_number_map.ravel())[0])
+    shift = occupied * PLATE_BITS
+    code = game.board.cell_codes[occupied]
+    # slice type 7 does not exist, and slices must be stored in sorted order
+    unsorted = (code & SLICE_MASK) << SLICE_BITS | 7
+    for bad_code in (7, unsorted, SLICE_MASK << (PLATE_BITS - SLICE_BITS)):
+        bad_key = key & ~(((1 << PLATE_BITS) - 1) << shift) | bad_code << shift
+        data_with_code = bytearray(data)
+        data_with_code[BOARD:PLATE_NUMBERS] = bad_key.to_bytes(savegame.BOARD_KEY_BYTES, "little")
+        with pytest.raises(SaveFormatError):
+            savegame.decode_snapshot(bytes(data_with_code))
+
+def test_damaged_snapshots_fail_cleanly(snapshot):
+    # random damage either fails with SaveFormatError or gives a game that can still be played and saved
+    _, data = snapshot
+    rng = random.Random(0)
+    for _ in range(3000):
+        damaged = bytearray(data)
+        for _ in range(rng.randint(1, 4)):
+            damaged[rng.randrange(len(damaged))] = rng.randrange(256)
+        try:
+            game = savegame.game_from_saved(savegame.decode_snapshot(bytes(damaged)))
+        except SaveFormatError:
+            continue
+        move = random_policy(game, np.random.default_rng(0))
+        if move is not None:
+            savegame.play_move(game, *move)
+        encoded(game)
+
+def test_rejects_bad_journals(tmp_path, snapshot):
+    game, data = snapshot
+    path = str(tmp_path / "bad.journal")
+    header = savegame._HEADER.pack(savegame.JOURNAL_MAGIC, savegame.JOURNAL_VERSION)
+    occupied = int(np.flatnonzero(game.board.plate_number_map.ravel())[0])
+    for contents in (
+        b"",
+        os.urandom(256),
+        header,
+        header + savegame._record(savegame.MOVE, savegame._MOVE.pack(0, 0, 0)),
+        header + savegame._record(9, b""),
+        header + savegame._record(savegame.CHECKPOINT, data[:-1]),
+        header + savegame._record(savegame.CHECKPOINT, data)
+            + savegame._record(savegame.MOVE, savegame._MOVE.pack(0, *divmod(occupied, COLS))),
+        header + savegame._record(savegame.CHECKPOINT, data) + savegame._record(savegame.MOVE, savegame._MOVE.pack(0, ROWS, 0))
+    ):
+        with open(path, "wb") as file:
+            file.write(contents)
+        with pytest.raises(SaveFormatError):
+            savegame.load_journal(path)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from constants import *
+from game import CakeSortGame
+from transition_cache import TransitionCache
+
+def play(game, seed: int, placements: int):
+    # yields the moves and cleared cells of every placement, with the state after it
+    rng = np.random.default_rng(seed)
+    for _ in range(placements):
+        if not game.current_plates:
+            game.reset_plates()
+        free = np.flatnonzero(game.board.plate_number_map.ravel() == 0)
+        if not len(free):
+            return
+        moves = game.place_plate(int(rng.integers(len(game.current_plates))), *divmod(int(rng.choice(free)), COLS))
+        cleared = game.cleanup_empty_plates()
+        yield moves, cleared, game.snapshot()
+
+@pytest.mark.parametrize("capacity", [1 << 16, 8])
+def test_cache_matches_uncached_engine(capacity):
+    # a small capacity also replays entries right before they are evicted
+    cache = TransitionCache(capacity)
+    for seed in range(150):
+        cached = CakeSortGame(seed)
+        cached.transition_cache = cache
+        uncached = CakeSortGame(seed)
+        uncached.transition_cache = None
+        for with_cache, without_cache in zip(play(cached, seed, 40), play(uncached, seed, 40)):
+            assert with_cache == without_cache
+    assert cache.hits and cache.misses
+    if capacity == 8:
+        assert cache.evictions and len(cache) == 8
+
+def test_tracing_bypasses_cache():
+    cache = TransitionCache()
+    game = CakeSortGame(0)
+    game.transition_cache = cache
+    game.enable_tracing()
+    for _ in play(game, 0, 20):
+        pass
+    assert cache.hits == cache.misses == 0
+
+def test_lru_order():
+    cache = TransitionCache(2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from constants import *
+from game import CakeSortGame
+from vec_game import VecCakeSortGame
+
+def board_counts(game) -> tuple[np.ndarray, np.ndarray]:
+    counts = np.zeros((ROWS, COLS, len(CAKE_SLICE_TYPES)), dtype=np.int64)
+    occupied = game.board.plate_number_map != 0
+    for row, column in zip(*np.nonzero(occupied)):
+        counts[row, column] = game.board.get_plate(row, column).counts
+    return counts, occupied
+
+def assert_same(games, vec_game):
+    for index, game in enumerate(games):
+        counts, occupied = board_counts(game)
+        np.testing.assert_array_equal(vec_game.counts[index], counts)
+        np.testing.assert_array_equal(vec_game.occupied[index], occupied)
+        hand = [plate.counts for plate in game.current_plates]
+        assert vec_game.plates_left[index] == len(hand)
+        np.testing.assert_array_equal(vec_game.current_plates[index, :len(hand)], np.reshape(hand, (len(hand), -1)))
+        assert vec_game.score[index] == game.score
+        assert vec_game.interacted_slices[index] == game.interacted_slices
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_lockstep_with_scalar_engine(seed, number_of_games=100, placements=40):
+    # the same random placements in both engines must give the same boards, hands, scores and interactions
+    rng = np.random.default_rng(seed)
+    games = [CakeSortGame([seed, index]) for index in range(number_of_games)]
+    vec_game = VecCakeSortGame.from_games(games, seed)
+    assert_same(games, vec_game)
+
+    for _ in range(placements):
+        plate_indexes = np.zeros(number_of_games, dtype=np.intp)
+        cells = np.zeros(number_of_games, dtype=np.intp)
+        active = np.zeros(number_of_games, dtype=bool)
+        for index, game in enumerate(games):
+            free = np.flatnonzero(game.board.plate_number_map.ravel() == 0)
+            if not len(free):
+                continue
+            active[index] = True
+            plate_indexes[index] = rng.integers(len(game.current_plates))
+            cells[index] = rng.choice(free)
+            game.place_plate(int(plate_indexes[index]), *divmod(int(cells[index]), COLS))
+            game.cleanup_empty_plates()
+
+        placed = vec_game.place_plate(plate_indexes, *np.divmod(cells, COLS), active)
+        np.testing.assert_array_equal(placed, active)
+        vec_game.cleanup_empty_plates()
+
+        # refills come from each engine's own generator, so the scalar hand is copied over
+        for index, game in enumerate(games):
+            if not game.current_plates:
+                game.reset_plates()
+                vec_game.current_plates[index] = [plate.counts for plate in game.current_plates]
+                vec_game.plates_left[index] = len(game.current_plates)
+        assert_same(games, vec_game)
+
+def test_to_game_round_trip():
+    rng = np.random.default_rng(3)
+    vec_game = VecCakeSortGame(8, 3)
+    for _ in range(10):
+        vec_game.place_plate(0, *np.divmod(rng.integers(ROWS * COLS, size=8), COLS))
+        vec_game.cleanup_empty_plates()
+        vec_game.get_states()
+    games = [vec_game.to_game(index) for index in range(8)]
+    assert_same(games, vec_game)
+    assert_same(games, VecCakeSortGame.from_games(games))
@@ -0,0 +1,34 @@
+import json
+from collections import deque
+
+class TraceBuffer:
+    def __init__(self, capacity: int = 4096):
+        self.events = deque(maxlen=capacity)
+        self.sequence = 0
+
+    def record(self, event: str, **fields):
+        fields["event"] = event
+        fields["seq"] = self.sequence
+        self.sequence += 1
+        self.events.append(fields)
+
+    def clear(self):
+        self.events.clear()
+
+    def dump_jsonl(self, path: str, append: bool = True) -> int:
+        with open(path, "a" if append else "w") as file:
+            for event in self.events:
+                file.write(json.dumps(event, default=_to_json) + "\n")
+        return len(self.events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+def _to_json(value):
+    # NumPy scalars coming from Plate.slices / plate_number_map
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
@@ -1,11 +1,16 @@
 import numpy as np
-import random
-from collections import deque
+import time
 from statistics import *
 from constants import *
+import tensorflow as tf
 from tensorflow.keras.models import Model
 from tensorflow.keras import layers,optimizers,Input
+from tensorflow.keras.utils import set_random_seed
 from env import Env
+from replay import ReplayBuffer
+from policy import epsilon_greedy
+from symmetry import random_symmetries
+from metrics import MetricsWriter, PhaseTimer, RunningStats
 
 state_size = ROWS * COLS * MAX_SLICES_PER_PLATE + MAX_SLICES_PER_PLATE - 1
 action_size = ROWS * COLS
@@ -13,94 +18,181 @@ gamma = 0.95
 epsilon = 1.0
 epsilon_min = 0.1
 epsilon_decay = 0.98
+learning_rate = 10e-5
 batch_size = 64
 episodes = 1000
-memory = deque(maxlen=20000)
-
-full_input = Input(shape=(125,))
-board_input = layers.Lambda(lambda x: x[:,:120])(full_input)
-plate_input = layers.Lambda(lambda x: x[:,120:])(full_input)
-conv_reshaped = layers.Reshape((5,4,6))(board_input)
-board_out = layers.Conv2D(32,(3,3),activation="relu",padding="same")(conv_reshaped)
-board_out = layers.Flatten()(board_out)
-concat = layers.Concatenate()([board_out,plate_input])
-output = layers.Dense(action_size,activation="linear")(concat)
-model = Model(inputs=full_input,outputs=output)
-model.compile(loss="mse",optimizer=optimizers.Adam(learning_rate=10e-5))
-
-env = Env()
-
-def stats(array):
-    print(
-        "Statistics:",
-        f"{len(array)=}",f"{max(array)=}",f"{mean(array)=}",f"{median(array)=}",
-        sep="\n"
+memory_size = 20000
+# replay ratio: one gradient step every train_every env steps
+train_every = 4
+target_update_every = 1000
+# train on each sampled transition in a random board orientation; off by default because the
+# merge rules break ties by neighbour order, so about 1.4% of mirrored placements resolve
+# differently and their transitions carry a wrong reward and next state
+augment_symmetries = False
+seed = 0
+
+def build_model():
+    full_input = Input(shape=(state_size,))
+    # the split point and output shapes are saved with the layers, so Keras 3 can reload the model
+    board_input = layers.Lambda(
+        lambda x,split: x[:,:split],output_shape=(BOARD_STATE_SIZE,),arguments={"split":BOARD_STATE_SIZE},name="board_slice"
+    )(full_input)
+    plate_input = layers.Lambda(
+        lambda x,split: x[:,split:],output_shape=(state_size-BOARD_STATE_SIZE,),arguments={"split":BOARD_STATE_SIZE},name="plate_slice"
+    )(full_input)
+    conv_reshaped = layers.Reshape((ROWS,COLS,MAX_SLICES_PER_PLATE))(board_input)
+    board_out = layers.Conv2D(32,(3,3),activation="relu",padding="same")(conv_reshaped)
+    board_out = layers.Flatten()(board_out)
+    concat = layers.Concatenate()([board_out,plate_input])
+    output = layers.Dense(action_size,activation="linear")(concat)
+    model = Model(inputs=full_input,outputs=output)
+    model.compile(loss="mse",optimizer=optimizers.Adam(learning_rate=learning_rate))
+    return model
+
+def make_target_model(model):
+    # rebuilt rather than cloned: Keras 3 refuses to clone the Lambda slices
+    target_model = build_model()
+    target_model.set_weights(model.get_weights())
+    return target_model
+
+def make_train_step(model, target_model):
+    optimizer = model.optimizer
+    batch_spec = (
+        tf.TensorSpec((None, state_size), tf.uint8),
+        tf.TensorSpec((None,), tf.int16),
+        tf.TensorSpec((None,), tf.float32),
+        tf.TensorSpec((None, state_size), tf.uint8),
+        tf.TensorSpec((None,), tf.bool)
     )
 
-def act(state, epsilon):
-    q_values = model.predict(state[np.newaxis], verbose=0)[0]
-
-    valid_actions = []
-    for action in range(action_size):
-        row, col = divmod(action, COLS)
-        if not env.game.board.get_plate_number(row, col):
-            valid_actions.append(action)
-
-    if not valid_actions:
-        return random.randrange(action_size)
-
-    if np.random.rand() <= epsilon:
-        return random.choice(valid_actions)
-
-    masked_q = np.full_like(q_values, -np.inf)
-    for a in valid_actions:
-        masked_q[a] = q_values[a]
-
-    return np.argmax(masked_q)
-
-file = open("training.txt","a")
-rewards = []
-
-for episode in range(episodes):
-    state = env.reset()
-    total_reward = 0
-    total_score = 0
-    losses = []
-
-    for step_num in range(200):
-        action = act(state, epsilon)
-        next_state,score,bonus,done = env.step(action)
-        total_score+=score
-        total_reward+=score+bonus
-
-        memory.append((state, action, score+bonus, next_state, done))
-        state = next_state
-
-        if done:
-            break
-
-        if len(memory) >= batch_size:
-            minibatch = random.sample(memory, batch_size)
-            states = np.array([x[0] for x in minibatch])
-            targets = model.predict(states, verbose=0)
-            next_states = np.array([x[3] for x in minibatch])
-            targets_next = model.predict(next_states, verbose=0)
-
-            for i, (s, a, r, s_next, d) in enumerate(minibatch):
-                targets[i][a] = r if d else r + gamma * np.max(targets_next[i])
-
-            history = model.fit(states, targets, epochs=1, verbose=0)
-            losses.append(history.history["loss"][0])
+    @tf.function(input_signature=batch_spec)
+    def train_step(states, actions, rewards, next_states, dones):
+        # targets come from the target network, so they stay outside the tape
+        next_q = target_model(tf.cast(next_states, tf.float32), training=False)
+        targets = rewards + gamma * tf.reduce_max(next_q, axis=1) * (1.0 - tf.cast(dones, tf.float32))
+        with tf.GradientTape() as tape:
+            q_values = model(tf.cast(states, tf.float32), training=True)
+            chosen = tf.gather(q_values, tf.cast(actions, tf.int32), axis=1, batch_dims=1)
+            # same value as the mse over every output with only the taken action changed
+            loss = tf.reduce_mean(tf.square(targets - chosen)) / action_size
+        gradients = tape.gradient(loss, model.trainable_variables)
+        optimizer.apply_gradients(zip(gradients, model.trainable_variables))
+        return loss
+
+    return train_step
+
+def make_q_values(model):
+    @tf.function(input_signature=(tf.TensorSpec((None, state_size), tf.uint8),))
+    def q_values(states):
+        return model(tf.cast(states, tf.float32), training=False)
+
+    return q_values
+
+def act(env, q_values, state, epsilon, rng):
+    return int(epsilon_greedy(q_values, state[np.newaxis], env.get_action_mask()[np.newaxis], epsilon, rng)[0])
+
+PHASES = ("act","env","replay","update")
+METRIC_FIELDS = [
+    "episode","steps","reward","score","mean_loss","epsilon","seconds","steps_per_second",
+    *[f"time_{name}" for name in PHASES],
+    "score_mean","score_median","score_max","score_std"
+]
+
+def train(episodes=episodes, seed=seed, epsilon=epsilon, metrics_path="training_metrics.jsonl"):
+    set_random_seed(seed)
+    model = build_model()
+    target_model = make_target_model(model)
+    train_step = make_train_step(model, target_model)
+    q_values = make_q_values(model)
+
+    memory = ReplayBuffer(memory_size,seed=seed)
+    env = Env(seed=seed)
+    rng = np.random.default_rng(seed)
+    total_steps = 0
+
+    writer = MetricsWriter(metrics_path,METRIC_FIELDS)
+    scores = RunningStats()
+    timer = PhaseTimer(PHASES)
+
+    for episode in range(episodes):
+        # env states are read-only views of one buffer, so keep a copy of the previous one
+        state = env.reset().copy()
+        total_reward = 0
+        total_score = 0
+        losses = []
+        start = time.perf_counter()
+
+        for step_num in range(200):
+            with timer.phase("act"):
+                action = act(env, q_values, state, epsilon, rng)
+            with timer.phase("env"):
+                next_state,score,bonus,done = env.step(action)
+            total_score+=score
+            total_reward+=score+bonus
+            total_steps+=1
+
+            with timer.phase("replay"):
+                memory.add(state, action, score+bonus, next_state, done)
+            state = next_state.copy()
+
+            if total_steps % target_update_every == 0:
+                target_model.set_weights(model.get_weights())
+
+            if done:
+                break
+
+            if len(memory) >= batch_size and total_steps % train_every == 0:
+                with timer.phase("replay"):
+                    batch = memory.sample(batch_size)
+                    if augment_symmetries:
+                        batch = random_symmetries(*batch, rng)
+                # forward and backward pass run fused in one compiled call
+                with timer.phase("update"):
+                    losses.append(float(train_step(*batch)))
+        else:
+            print("HEI")
+            quit()
+
+        seconds = time.perf_counter() - start
+        epsilon = max(epsilon_min,epsilon*epsilon_decay)
+        scores.add(total_score)
+        # None, written as null, for episodes that ended before the first update
+        mean_loss = mean(losses) if losses else None
+        record = {
+            "episode": episode+1,
+            "steps": step_num+1,
+            "reward": total_reward,
+            "score": total_score,
+            "mean_loss": mean_loss,
+            "epsilon": epsilon,
+            "seconds": seconds,
+            "steps_per_second": (step_num+1)/seconds,
+            **{f"time_{name}": total for name, total in timer.reset().items()},
+            **scores.summary("score")
+        }
+        writer.write(record)
+        print(
+            f"Episode {episode+1}, Total reward: {total_reward}, Mean loss: {mean_loss}, Epsilon: {epsilon:.3f}, "
+            f"Steps/s: {record['steps_per_second']:.1f}, Score mean/median/max: "
+            f"{scores.mean:.2f}/{scores.median:.2f}/{scores.max:.2f}"
+        )
+
+    writer.close()
+    print(f"Used memory: {len(memory)}")
+    model.save("cake_sort_model.h5")
+    return model
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Train the cake sort DQN.")
+    parser.add_argument("--episodes", type=int, default=episodes)
+    parser.add_argument("--seed", type=int, default=seed)
+    parser.add_argument("--metrics", default="training_metrics.jsonl", help="per-episode metrics, CSV for .csv paths and JSONL otherwise")
+    parser.add_argument("--actors", type=int, default=0, help="worker processes collecting transitions for a separate learner")
+    parser.add_argument("--steps", type=int, default=200000, help="transitions to learn from in actor/learner mode")
+    args = parser.parse_args()
+    if args.actors:
+        from actor_learner import learn
+        learn(args.actors, args.steps, args.seed)
     else:
-        print("HEI")
-        quit()
-
-    epsilon = max(epsilon_min,epsilon*epsilon_decay)
-    rewards.append(total_score)
-    print(f"Episode {episode+1}, Total reward: {total_reward}, Mean loss: {mean(losses) if losses else float('-inf')}, Epsilon: {epsilon:.3f}")
-    stats(rewards)
-    file.write(f"Episode {episode+1}, Total reward: {total_reward}, Mean loss: {mean(losses) if losses else float('-inf')}, Epsilon: {epsilon:.3f}\n")
-
-file.close()
-print(f"Used memory: {len(memory)}")
-model.save("cake_sort_model.h5")
+        train(args.episodes, args.seed, metrics_path=args.metrics)
@@ -0,0 +1,264 @@
+import numpy as np
+
+from constants import *
+from board import NEIGHBOR_CELLS
+from plate import Plate, PLATE_CATALOG_COUNTS, generate_plates
+
+NUMBER_OF_CELLS = ROWS * COLS
+NUMBER_OF_SLICE_TYPES = len(CAKE_SLICE_TYPES)
+MAX_NEIGHBORS = 4
+
+# neighbours of every cell in Board.get_neighbors_indexes order, padded with -1
+NEIGHBOR_TABLE = np.full((NUMBER_OF_CELLS, MAX_NEIGHBORS), -1, dtype=np.intp)
+for cell, neighbor_cells in enumerate(NEIGHBOR_CELLS):
+    NEIGHBOR_TABLE[cell, :len(neighbor_cells)] = neighbor_cells
+
+def counts_to_slots(counts: np.ndarray, slots: int = MAX_SLICES_PER_PLATE) -> np.ndarray:
+    # (..., types) counts -> (..., slots) sorted slice types padded with 0, like Plate.slices
+    cumulative = np.cumsum(counts, axis=-1)
+    positions = np.arange(slots)[:, None]
+    types = (cumulative[..., None, :] <= positions).sum(axis=-1) + 1
+    return np.where(positions[:, 0] < cumulative[..., -1:], types, 0).astype(np.uint8)
+
+def _type_count(counts: np.ndarray) -> np.ndarray:
+    return np.count_nonzero(counts, axis=-1)
+
+class VecCakeSortGame:
+    def __init__(self, number_of_games: int, seed=None):
+        self.number_of_games = number_of_games
+        self.rng = np.random.default_rng(seed)
+        self.counts = np.zeros((number_of_games, ROWS, COLS, NUMBER_OF_SLICE_TYPES), dtype=np.int8)
+        self.occupied = np.zeros((number_of_games, ROWS, COLS), dtype=bool)
+        self.current_plates = np.zeros((number_of_games, PLATES_PER_HAND, NUMBER_OF_SLICE_TYPES), dtype=np.int8)
+        self.plates_left = np.zeros(number_of_games, dtype=np.intp)
+        self.score = np.zeros(number_of_games, dtype=np.int64)
+        self.interacted_slices = np.zeros(number_of_games, dtype=np.int64)
+        # flat per-cell views shared with the arrays above
+        self.cell_counts = self.counts.reshape(number_of_games, NUMBER_OF_CELLS, NUMBER_OF_SLICE_TYPES)
+        self.cell_occupied = self.occupied.reshape(number_of_games, NUMBER_OF_CELLS)
+        # flat game * NUMBER_OF_CELLS + cell indexes touched since the last cleanup
+        self.dirty_cells = []
+        self.reset()
+
+    def __all_games(self, mask):
+        return np.ones(self.number_of_games, dtype=bool) if mask is None else np.asarray(mask, dtype=bool)
+
+    def mark_all_dirty(self):
+        self.dirty_cells = [np.arange(self.number_of_games * NUMBER_OF_CELLS)]
+
+    def reset(self, mask=None):
+        mask = self.__all_games(mask)
+        self.counts[mask] = 0
+        self.occupied[mask] = False
+        self.score[mask] = 0
+        self.interacted_slices[mask] = 0
+        self.reset_plates(mask)
+
+    def reset_plates(self, mask=None):
+        games = np.flatnonzero(self.__all_games(mask))
+        self.current_plates[games] = PLATE_CATALOG_COUNTS[
+            generate_plates(len(games) * PLATES_PER_HAND, self.rng)
+        ].reshape(len(games), PLATES_PER_HAND, NUMBER_OF_SLICE_TYPES)
+        self.plates_left[games] = PLATES_PER_HAND
+
+    def place_plate(self, plate_index, row_index, column_index, mask=None) -> np.ndarray:
+        games = np.arange(self.number_of_games)
+        plate_index = np.broadcast_to(plate_index, games.shape)
+        cells = np.broadcast_to(np.asarray(row_index) * COLS + column_index, games.shape)
+        placed = self.__all_games(mask)\
+            & ~self.cell_occupied[games, cells]\
+            & (plate_index < self.plates_left)
+        games, plate_index, cells = games[placed], plate_index[placed], cells[placed]
+        if not len(games):
+            return placed
+
+        # pop the selected plate, shifting the rest of the hand left like list.pop
+        selected = self.current_plates[games, plate_index].astype(np.int64)
+        hand_slots = np.arange(PLATES_PER_HAND)
+        source_slots = np.minimum(hand_slots + (hand_slots >= plate_index[:, None]), PLATES_PER_HAND - 1)
+        hand = self.current_plates[games[:, None], source_slots]
+        hand[hand_slots >= self.plates_left[games, None] - 1] = 0
+        self.current_plates[games] = hand
+        self.plates_left[games] -= 1
+
+        # slot 0 holds the placed plate, slots 1..4 its neighbours
+        neighbors = NEIGHBOR_TABLE[cells]
+        has_neighbor = neighbors >= 0
+        local = np.zeros((len(games), MAX_NEIGHBORS + 1, NUMBER_OF_SLICE_TYPES), dtype=np.int64)
+        local[:, 0] = selected
+        local[:, 1:] = np.where(
+            has_neighbor[..., None],
+            self.cell_counts[games[:, None], np.maximum(neighbors, 0)],
+            0
+        )
+
+        self.interacted_slices[games] += self.__resolve(local)
+
+        self.cell_counts[games, cells] = local[:, 0]
+        self.cell_occupied[games, cells] = True
+        for k in range(MAX_NEIGHBORS):
+            valid = has_neighbor[:, k]
+            self.cell_counts[games[valid], neighbors[valid, k]] = local[valid, k + 1]
+
+        touched = np.concatenate((cells[:, None], neighbors), axis=1)
+        self.dirty_cells.append((games[:, None] * NUMBER_OF_CELLS + touched)[touched >= 0])
+        return placed
+
+    @staticmethod
+    def __resolve(local: np.ndarray) -> np.ndarray:
+        # array form of CakeSortGame.__process_new_plate over a batch of neighbourhoods
+        games = np.arange(len(local))
+        interacted = np.zeros(len(local), dtype=np.int64)
+
+        def move(source, destination, slice_type, mask):
+            available = local[games, source, slice_type]
+            space = MAX_SLICES_PER_PLATE - local[games, destination].sum(axis=-1)
+            count = np.where(mask, np.minimum(available, space), 0)
+            local[games, source, slice_type] -= count
+            local[games, destination, slice_type] += count
+            interacted[:] += count
+
+        def is_clearable(slot):
+            plate = local[games, slot]
+            return (plate.sum(axis=-1) == MAX_SLICES_PER_PLATE) & (_type_count(plate) == 1)
+
+        # neighbours sharing each type with the placed plate, fixed before any slice moves
+        shared = (local[:, 1:] > 0) & (local[:, :1] > 0)
+
+        # grouped keys come in order of first appearance: neighbour order, then type
+        first_neighbor = np.where(
+            shared.any(axis=1),
+            np.argmax(shared, axis=1),
+            MAX_NEIGHBORS
+        )
+        group_order = np.argsort(
+            first_neighbor * NUMBER_OF_SLICE_TYPES + np.arange(NUMBER_OF_SLICE_TYPES),
+            axis=1,
+            kind="stable"
+        )
+        number_of_groups = shared.any(axis=1).sum(axis=1)
+
+        for group in range(NUMBER_OF_SLICE_TYPES):
+            active = group < number_of_groups
+            if not active.any():
+                break
+            slice_type = group_order[:, group]
+            members = shared[games, :, slice_type]
+            group_size = members.sum(axis=1)
+
+            # Case 0x111: a single-type plate takes the type from every neighbour in the group
+            single = active & (group_size > 1) & (_type_count(local[:, 0]) == 1)
+            for k in range(MAX_NEIGHBORS):
+                move(k + 1, 0, slice_type, single & members[:, k])
+
+            # Case 0x222: the neighbour with the most slices of the type (and free space) collects them
+            multiple = active & (group_size > 1) & ~single
+            if multiple.any():
+                neighbor_counts = local[games, 1:, slice_type]
+                has_space = local[:, 1:].sum(axis=-1) < MAX_SLICES_PER_PLATE
+                sort_key = np.where(members, np.where(has_space, neighbor_counts, 0), -1)
+                ordered = np.argsort(sort_key, axis=1, kind="stable")
+                first = MAX_NEIGHBORS - group_size
+                ordered_group = lambda index: ordered[games, np.clip(first + index, 0, MAX_NEIGHBORS - 1)]
+                selected = ordered[:, -1]
+                remaining = group_size - 1
+
+                for index in range(MAX_NEIGHBORS - 1):
+                    move(ordered_group(index) + 1, 0, slice_type, multiple & (index < remaining))
+                move(0, selected + 1, slice_type, multiple)
+
+                # the subcase loop pops from the list it iterates over
+                for index in range(MAX_NEIGHBORS - 1):
+                    neighbor = ordered_group(index)
+                    neighbor_count = local[games, neighbor + 1, slice_type]
+                    retry = multiple\
+                        & (index < remaining)\
+                        & (neighbor_count != 0)\
+                        & (neighbor_count != MAX_SLICES_PER_PLATE)\
+                        & (local[games, 0, slice_type] > 0)
+                    pop = retry & is_clearable(selected + 1)
+                    selected = np.where(pop, ordered_group(remaining - 1), selected)
+                    remaining = np.where(pop, remaining - 1, remaining)
+                    move(neighbor + 1, 0, slice_type, retry)
+                    move(0, selected + 1, slice_type, retry)
+
+            # a single neighbour shares the type; Case 0x22 can never be taken by the scalar engine
+            alone = active & (group_size == 1)
+            neighbor = np.argmax(members, axis=1)
+            to_neighbor = alone\
+                & (_type_count(local[games, neighbor + 1]) == 1)\
+                & (_type_count(local[:, 0]) != 1)
+            move(0, neighbor + 1, slice_type, to_neighbor)
+            move(neighbor + 1, 0, slice_type, alone & ~to_neighbor)
+
+        return interacted
+
+    def cleanup_empty_plates(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # returns (games, rows, columns) of the emptied plates, like CakeSortGame.cleanup_empty_plates
+        if not self.dirty_cells:
+            empty = np.empty(0, dtype=np.intp)
+            return empty, empty, empty
+        games, cells = np.divmod(np.unique(np.concatenate(self.dirty_cells)), NUMBER_OF_CELLS)
+        self.dirty_cells = []
+
+        counts = self.cell_counts[games, cells]
+        occupied = self.cell_occupied[games, cells]
+        totals = counts.sum(axis=-1)
+        empty = occupied & (totals == 0)
+        clearable = occupied & (totals == MAX_SLICES_PER_PLATE) & (_type_count(counts) == 1)
+
+        self.cell_counts[games[clearable], cells[clearable]] = 0
+        self.cell_occupied[games[empty | clearable], cells[empty | clearable]] = False
+        np.add.at(self.score, games[clearable], 1)
+        return (games[empty], *np.divmod(cells[empty], COLS))
+
+    def get_states(self, plate_index=0) -> np.ndarray:
+        games = np.arange(self.number_of_games)
+        refill = self.plates_left == 0
+        if refill.any():
+            self.reset_plates(refill)
+        states = np.empty((self.number_of_games, STATE_SIZE), dtype=np.uint8)
+        states[:, :BOARD_STATE_SIZE] = counts_to_slots(self.cell_counts).reshape(self.number_of_games, -1)
+        states[:, BOARD_STATE_SIZE:] = counts_to_slots(
+            self.current_plates[games, plate_index], MAX_SLICES_PER_PLATE - 1
+        )
+        return states
+
+    def get_empty_spaces(self) -> np.ndarray:
+        return NUMBER_OF_CELLS - self.cell_occupied.sum(axis=1)
+
+    @staticmethod
+    def from_games(games, seed=None):
+        vec_game = VecCakeSortGame(len(games), seed)
+        for index, game in enumerate(games):
+            for row in range(ROWS):
+                for column in range(COLS):
+                    if game.board.get_plate_number(row, column):
+                        vec_game.counts[index, row, column] = game.board.get_plate(row, column).counts
+                        vec_game.occupied[index, row, column] = True
+            vec_game.current_plates[index] = 0
+            for slot, plate in enumerate(game.current_plates):
+                vec_game.current_plates[index, slot] = plate.counts
+            vec_game.plates_left[index] = len(game.current_plates)
+            vec_game.score[index] = game.score
+            vec_game.interacted_slices[index] = game.interacted_slices
+        vec_game.mark_all_dirty()
+        return vec_game
+
+    def to_game(self, index: int):
+        from game import CakeSortGame
+        game = CakeSortGame()
+        game.current_plates = [
+            Plate(np.repeat(CAKE_SLICE_TYPES, counts))
+                for counts in self.current_plates[index, :self.plates_left[index]]
+        ]
+        for row in range(ROWS):
+            for column in range(COLS):
+                if self.occupied[index, row, column]:
+                    plate = Plate(np.repeat(CAKE_SLICE_TYPES, self.counts[index, row, column]))
+                    game.board.place_plate(row, column, game.plate_counter, plate)
+                    game.placed_plates[game.plate_counter] = plate
+                    game.plate_counter += 1
+        game.score = int(self.score[index])
+        game.interacted_slices = int(self.interacted_slices[index])
+        return game